@@ -1,6 +1,13 @@
 from backtrader import Strategy
 from trading import Signal
 from algo import algo
+from pivot import Pivot
+from signalengine import SignalEngine
+from eventlog import EventLog
+from array import array
+import time
+import numpy as np
+import profiler
 import backtrader as bt
 
 #
@@ -14,28 +21,17 @@ def log_signal(level, i, data, signal):
     name = "BUY" if signal == Signal.BUY else "SELL" if signal == Signal.SELL else "NONE"
     logger.log(level, f'{i}, {data.open.array[i]}, {data.high.array[i]}, {data.low.array[i]}, {data.close.array[i]}, {data.volume.array[i]}, {name}')
 
+# logs the candles with a signal in s (Signal.BUY, Signal.SELL or Signal.EITHER)
 def log_signals(level, data, signals, s):
-    if level < logger.level:
+    if not logger.isEnabledFor(level):
         return
 
-    for i in range(0, len(signals)):
-        match(s):
-            case Signal.BUY:
-                if Signal.BUY == signals[i]:
-                    log_signal(level, i, data, signals[i])
-
-            case Signal.SELL:
-                if Signal.SELL == signals[i]:
-                    log_signal(level, i, data, signals[i])
-
-            case Signal.EITHER:
-                if signals[i] in [Signal.BUY, Signal.SELL]:
-                    log_signal(level, i, data, signals[i])
+    signals = np.asarray(signals)
+    for i in np.flatnonzero((signals != Signal.NONE) & ((signals & s) == signals)):
+        log_signal(level, i, data, signals[i])
 
 
 
-from array import array
-
 class BreakoutStrategy(Strategy):
 
     LOG_INIT = False
@@ -43,6 +39,20 @@ class BreakoutStrategy(Strategy):
 
     LOG_LEVEL = logging.INFO
 
+    # strategy events (orders, trades), see EventLog
+    MESSAGES = dict(
+        open_sell      = 'OPEN SELL [close={close:6.4f}, stoploss={stop:6.4f}, limit={limit:6.4f}]',
+        open_buy       = 'OPEN BUY [close={close:6.4f}, stoploss={stop:6.4f}, limit={limit:6.4f}]',
+        buy_executed   = 'BUY EXECUTED [Price: {price:.2f}, Cost: {value:.2f}, Comm: {comm:.2f}]',
+        sell_executed  = 'SELL EXECUTED [Price: {price:.2f}, Cost: {value:.2f}, Comm: {comm:.2f}]',
+        order_canceled = 'Order Canceled',
+        order_margin   = 'Order Margin',
+        order_rejected = 'Order Rejected',
+        trade_closed   = 'OPERATION PROFIT, GROSS {pnl:8.3f}, NET {pnlcomm:8.3f}\n******'
+    )
+
+    EVENTS = EventLog(MESSAGES, level=LOG_LEVEL)
+
     LONG = True
     SHORT = False
 
@@ -68,24 +78,56 @@ class BreakoutStrategy(Strategy):
         gap_window   = 0,
         zone_height  = 0.0,
         breakout_f   = 0.0,
+        bounces      = algo.BOUNCES,    # number of pivots that form a zone
+
+        # only used in streaming mode, otherwise the pivots are calculated outside
+        pivot_window = Pivot.WINDOW,
+
+        # the pivots (pivot.PivotIndex or the dense array), None: the pivot
+        # line of the feed (feeds.ArrayData)
+        pivots       = None,
+
+        # optional SignalCache, shares signals between runs of an optimization
+        signal_cache = None,
 
-    #    pivot_window = 0,     <= not used now, pivots are calculated outside
-        pivots       = [int]
+        # optional export.Ledger, records the orders and trades of the run
+        ledger       = None,
+
+        # calculate the signals bar by bar (SignalEngine) instead of up front,
+        # works on live (growing) feeds
+        streaming    = False,
+
+        # only take signals in the direction of the ema trend (see algo.calc_trends)
+        trend_filter      = False,
+        ema_period        = 50,
+        trend_backcandles = 10
     )
 
 
     def log_parameters(self, params):
-        logger.debug(f'ticker: {params.ticker}, tp_sl_ratio: {params.tp_sl_ratio}, sl_distance: {params.sl_distance}, backcandles: {params.backcandles}, gap_window: {params.gap_window}, zone_height: {params.zone_height}, breakout_f: {params.breakout_f}')
+        if not logger.isEnabledFor(logging.DEBUG):
+            return
+        logger.debug(f'ticker: {params.ticker}, tp_sl_ratio: {params.tp_sl_ratio}, sl_distance: {params.sl_distance}, backcandles: {params.backcandles}, gap_window: {params.gap_window}, zone_height: {params.zone_height}, breakout_f: {params.breakout_f}, bounces: {params.bounces}')
 
 
     #
     # BreakoutStrategy.log
     #
     def log(self, txt, dt=None):
+        if not logger.isEnabledFor(BreakoutStrategy.LOG_LEVEL):
+            return
         dt = dt or self.data.datetime.date(0)
         logger.log(BreakoutStrategy.LOG_LEVEL, '%s, %s' % (dt.isoformat(), txt))
 
 
+    #
+    # records an event of the current bar, only called if self.event_log is set
+    # (the event log is enabled), the values are formatted when written
+    #
+    def log_event(self, name: str, **values):
+        self.event_log.emit(self.run_id, self.params.ticker, len(self), self.data.datetime[0], name, **values)
+
+
     #
     # BreakoutStrategy.__init__
     #
@@ -101,32 +143,77 @@ class BreakoutStrategy(Strategy):
         #self.open_positions = 0  the idea is to allow multiple orders in parallel up to MAX_OPEN
 
 
-        #self.data['ema'] = bt.indicators.ExponentialMovingAverage
-        #self.data['ema_signal'] = is_trend(self.data, backcandles=10)
-
-
         self.sl_dist = self.params.sl_distance     # stop distance as fraction of last close
         self.tp_sl   = self.params.tp_sl_ratio     # w/l ratio
 
         self.log_parameters(self.params)
 
+        # None if the level of the event log is disabled, checked once per run
+        self.run_id = BreakoutStrategy.run_nr
+        self.event_log = BreakoutStrategy.EVENTS if BreakoutStrategy.EVENTS.enabled else None
+
+        # profiling: signal generation and the bar loop, see profiler.py
+        t = time.perf_counter() if profiler.ENABLED else None
+        if t is not None:
+            self.next = self._timed_next
+
+        pivots = self.params.pivots
+        if pivots is None and 'pivot' in self.data.getlinealiases():
+            pivots = self.data.pivot.array
+
         # get signals and reset signal index
         self.signal_idx = 0
-        sz = self.data.buflen()
-        self.signals = array('i', [0] * sz)
-        for idx in range(0, sz):
-            self.signals[idx] = algo.calc_signal(
+        self.engine = None
+        if self.params.streaming:
+            self.engine = SignalEngine(
+                                    pivot_window = self.params.pivot_window,
+                                    backcandles  = self.params.backcandles,
+                                    gap_window   = self.params.gap_window,
+                                    zone_height  = self.params.zone_height,
+                                    breakout_f   = self.params.breakout_f,
+                                    bounces      = self.params.bounces,
+
+                                    trend_filter      = self.params.trend_filter,
+                                    ema_period        = self.params.ema_period,
+                                    trend_backcandles = self.params.trend_backcandles
+                                    )
+            self.signals = array('i')
+        elif self.params.signal_cache is not None:
+            self.signals = self.params.signal_cache.get(
                                     data        = self.data,
-                                    candle_idx  = idx,
                                     backcandles = self.params.backcandles,
                                     gap_window  = self.params.gap_window,
-                                    pivots      = self.params.pivots,
+                                    pivots      = pivots,
                                     zone_height = self.params.zone_height,
-                                    breakout_f  = self.params.breakout_f
+                                    breakout_f  = self.params.breakout_f,
+                                    bounces     = self.params.bounces
+                                    )
+        else:
+            self.signals = algo.calc_signal_array(
+                                    data        = self.data,
+                                    backcandles = self.params.backcandles,
+                                    gap_window  = self.params.gap_window,
+                                    pivots      = pivots,
+                                    zone_height = self.params.zone_height,
+                                    breakout_f  = self.params.breakout_f,
+                                    bounces     = self.params.bounces
                                     )
 
 
-        log_signals(logging.DEBUG, self.data, self.signals, Signal.BUY|Signal.SELL )
+        if self.engine is None and self.params.trend_filter:
+            trends = algo.calc_trend_filter(
+                                    open        = self.data.open.array,
+                                    close       = self.data.close.array,
+                                    ema_period  = self.params.ema_period,
+                                    backcandles = self.params.trend_backcandles
+                                    )
+            self.signals = algo.filter_trend(self.signals, trends)
+
+        if t is not None:
+            profiler.add('signals', time.perf_counter() - t)
+
+        if self.engine is None:
+            log_signals(logging.DEBUG, self.data, self.signals, Signal.BUY|Signal.SELL )
 
 
     def accept_short(self) -> bool:
@@ -141,9 +228,29 @@ class BreakoutStrategy(Strategy):
 
     def start(self):
         BreakoutStrategy.run_nr = BreakoutStrategy.run_nr + 1
+        self.t_start = time.perf_counter() if profiler.ENABLED else None
+
+
+    def stop(self):
+        if self.event_log is not None:
+            self.event_log.flush()
+
+        if self.t_start is not None:
+            profiler.add('bars', time.perf_counter() - self.t_start)
+
+
+    # next with profiling, replaces next (instance attribute) if profiling is on
+    def _timed_next(self):
+        t = time.perf_counter()
+        BreakoutStrategy.next(self)
+        profiler.add('next', time.perf_counter() - t)
 
 
     def next(self):
+        # streaming: signal of the new bar
+        if self.engine is not None:
+            self.signals.append(self.engine.append(self.data.open[0], self.data.high[0], self.data.low[0], self.data.close[0]))
+
         # log current close
         #self.log(f'Close price: {self.data.close[0]:8.4f}')
 
@@ -166,7 +273,8 @@ class BreakoutStrategy(Strategy):
                         stop1  = close * (1.0 + self.sl_dist)
                         limit1 = close * (1.0 - self.tp_sl * self.sl_dist)
 
-                        self.log(f'OPEN SELL [close={close:6.4f}, stoploss={stop1:6.4f}, limit={limit1:6.4f}]')
+                        if self.event_log is not None:
+                            self.log_event('open_sell', close=close, stop=stop1, limit=limit1)
                         self.order = self.sell_bracket(limitprice=limit1, stopprice=stop1, size=None)
 
                 case Signal.BUY:
@@ -174,7 +282,8 @@ class BreakoutStrategy(Strategy):
                         stop1  = close * (1.0 - self.sl_dist)
                         limit1 = close * (1.0 + self.tp_sl * self.sl_dist)
 
-                        self.log(f'OPEN BUY [close={close:6.4f}, stoploss={stop1:6.4f}, limit={limit1:6.4f}]')
+                        if self.event_log is not None:
+                            self.log_event('open_buy', close=close, stop=stop1, limit=limit1)
                         self.order = self.buy_bracket(limitprice=limit1, stopprice=stop1, size=None)
                         #self.order = self.buy_bracket(exectype=bt.Order.StopTrail, trailpercent=2*s_fac, limitprice=limit1)
                 case 0:
@@ -195,30 +304,37 @@ class BreakoutStrategy(Strategy):
         if order.status in [order.Submitted, order.Accepted]:
             return
 
+        if self.params.ledger is not None:
+            self.params.ledger.order(len(self), self.data.datetime.datetime(0), order)
+
 
         # order completed
         if order.status in [order.Completed]:
             # BUY
             if order.isbuy():
-                self.log(f'BUY EXECUTED [Price: {order.executed.price:.2f}, Cost: {order.executed.value:.2f}, Comm: {order.executed.comm:.2f}]')
+                if self.event_log is not None:
+                    self.log_event('buy_executed', price=order.executed.price, value=order.executed.value, comm=order.executed.comm)
 
                 self.buyprice = order.executed.price
                 self.buycomm = order.executed.comm
 
             # SELL
             elif order.issell():
-                self.log(f'SELL EXECUTED [Price: {order.executed.price:.2f}, Cost: {order.executed.value:.2f}, Comm: {order.executed.comm:.2f}]')
+                if self.event_log is not None:
+                    self.log_event('sell_executed', price=order.executed.price, value=order.executed.value, comm=order.executed.comm)
 
             #self.open_positions = self.open_positions +1
             self.bar_executed = len(self)
 
 
+        elif self.event_log is None:
+            pass
         elif order.status == order.Canceled:
-            self.log('Order Canceled')
+            self.log_event('order_canceled')
         elif order.status == order.Margin:
-            self.log('Order Margin')
+            self.log_event('order_margin')
         elif order.status == order.Rejected:
-            self.log('Order Rejected')
+            self.log_event('order_rejected')
 
         # Write down: no pending order
         self.order = None
@@ -228,11 +344,15 @@ class BreakoutStrategy(Strategy):
         if not trade.isclosed:
             return
 
+        if self.params.ledger is not None:
+            self.params.ledger.trade(trade, bt.num2date(trade.dtopen), bt.num2date(trade.dtclose))
+
         #self.open_positions = self.open_positions -2
         if BreakoutStrategy.VERBOSE:
             print(f'{trade.baropen:5d}, {bt.num2date(trade.dtopen)}, {trade.barclose:5d}, {bt.num2date(trade.dtclose)}, {trade.pnl:8.3f}, {trade.pnlcomm:8.3f}')
 
-        self.log(f'OPERATION PROFIT, GROSS {trade.pnl:8.3f}, NET {trade.pnlcomm:8.3f}\n******')
+        if self.event_log is not None:
+            self.log_event('trade_closed', pnl=trade.pnl, pnlcomm=trade.pnlcomm)
 
 
 
@@ -2,14 +2,19 @@ import logging
 logger = logging.getLogger()
 
 import statistics
-from trading import Signal
-from pivot import Pivot
+from array import array
+import numpy as np
+from pandas import Series
+from trading import Signal, Trend
+from pivot import Pivot, PivotIndex
 
 
 from backtrader import lineseries
 
 class algo:
 
+    BOUNCES = 3     # number of pivots that form a zone (default of the bounces parameter)
+
     @staticmethod
     def is_trend(close:list[float], open:list[float], ema:list[float], backcandles:int=10) -> list[int]:
         ema_signal = [0]*len(close)
@@ -34,64 +39,117 @@ class algo:
         return ema_signal
 
 
+    #
+    # vectorized version of is_trend
+    #
+    # a candle in the window with max(open, close) above the ema rules out
+    # a down trend, one with min(open, close) below the ema an up trend; the
+    # rolling "any over the window" is a difference of cumulative sums
+    #
+    # returns the same codes as is_trend (Trend.UP | Trend.DOWN)
+    #
     @staticmethod
-    def slice(data: lineseries, b: int, e: int):
-        return data.get(ago=e-data.buflen(), size=e-b)
+    def calc_trends(close: np.ndarray, open: np.ndarray, ema: np.ndarray, backcandles: int = 10) -> np.ndarray:
+        close = np.asarray(close, dtype=np.float64)
+        open  = np.asarray(open, dtype=np.float64)
+        ema   = np.asarray(ema, dtype=np.float64)
+
+        sz = len(close)
+        trends = np.full(sz, Trend.NONE, dtype=np.int64)
+        if backcandles >= sz:
+            return trends
 
+        # max(open, close) and min(open, close) as evaluated by the builtins
+        top    = np.where(close > open, close, open)
+        bottom = np.where(close < open, close, open)
 
+        above = np.concatenate(([0], np.cumsum(top > ema)))
+        below = np.concatenate(([0], np.cumsum(bottom < ema)))
+
+        idx = np.arange(backcandles, sz)
+        dnt = np.where(above[idx+1] == above[idx-backcandles], Trend.DOWN, Trend.NONE)
+        upt = np.where(below[idx+1] == below[idx-backcandles], Trend.UP, Trend.NONE)
+
+        trends[backcandles:] = upt | dnt
+        return trends
+
+
+    #
+    # exponential moving average (span period, not adjusted), NaN for the
+    # first period-1 values
+    #
     @staticmethod
-    def get_pivots(highlow: int, data: list[float], pivots: list[int]) -> list[float]:
-        values = []
-        for i in range(0, len(data)):
-            if pivots[i] == highlow:
-                values.append(data[i])
+    def ema(values: np.ndarray, period: int) -> np.ndarray:
+        ema = Series(np.asarray(values, dtype=np.float64)).ewm(span=period, adjust=False).mean().to_numpy(copy=True)
+        ema[:period-1] = np.nan
+        return ema
 
-        return values
 
+    #
+    # trend per candle for the trend filter, Trend.NONE as long as the
+    # window of a candle reaches into the first period-1 (no ema) candles
+    #
     @staticmethod
-    def get_pivots_high(data: list[float], pivots: list[int]) -> list[float]:
-        return algo.get_pivots(Pivot.HIGH, data, pivots)
+    def calc_trend_filter(open: np.ndarray, close: np.ndarray, ema_period: int, backcandles: int) -> np.ndarray:
+        trends = algo.calc_trends(close, open, algo.ema(close, ema_period), backcandles)
+        trends[:ema_period-1+backcandles] = Trend.NONE
+        return trends
+
 
+    #
+    # keeps SELL signals in a down trend and BUY signals in an up trend
+    #
     @staticmethod
-    def get_pivots_low(data: list[float], pivots: list[int]) -> list[float]:
-        return algo.get_pivots(Pivot.LOW, data, pivots)
+    def filter_trend(signals: np.ndarray, trends: np.ndarray) -> np.ndarray:
+        signals = np.asarray(signals)
+        sell = (signals == Signal.SELL) & ((trends & Trend.DOWN) != 0)
+        buy  = (signals == Signal.BUY) & ((trends & Trend.UP) != 0)
+        return np.where(sell | buy, signals, Signal.NONE)
 
 
-    import typing
     @staticmethod
-    def _check_breakout(f_breakout_test: typing.Callable[[float, float, float], int], values: list[float], zone_height: float, cclose: float) -> int:
+    def slice(data: lineseries, b: int, e: int):
+        return data.get(ago=e-data.buflen(), size=e-b)
 
-        # helper function: check if pivots form a zone
-        #def _is_zone(values , mean, height):
-        def _is_zone(values: list[float], mean: float, zheight: float):
-            for value in values:
-#                if abs(value-mean) > zheight:
-                if abs(value-mean) > zheight * mean:
-                    return False
-            return True
+
+    # helper function: check if pivots form a zone
+    @staticmethod
+    def _is_zone(values: list[float], mean: float, zheight: float) -> bool:
+        for value in values:
+#            if abs(value-mean) > zheight:
+            if abs(value-mean) > zheight * mean:
+                return False
+        return True
 
 
-        # main function body
+    import typing
+    @staticmethod
+    def _check_breakout(f_breakout_test: typing.Callable[[float, float, float], int], values: list[float], zone_height: float, cclose: float) -> int:
         mean = statistics.mean(values)
-        if _is_zone(values, mean, zone_height):
+        if algo._is_zone(values, mean, zone_height):
             return f_breakout_test(mean, cclose, zone_height)
 
         return Signal.NONE
 
 
 
+    #
+    # the per candle reference of calc_signals: the zone mean is the exact
+    # statistics.mean of the pivot values, so it is independent of the
+    # vectorized arithmetic (see PivotIndex.zones)
     #
     # data          the data feed
     # candle_idx    the current candle
     # backcandles   the width of the window of analysis
     # gap_window    gap must be >= pivot window to make sure pivot window doesn;t extend beyond current candle
-    # pivots        the array holding the pivots
+    # pivots        the PivotIndex of the pivots
     # zone_height   the RELATIVE price fluctuation
+    # bounces       the number of pivots that form a zone
     #
     #from backtrader.feed import Database
 
     @staticmethod
-    def calc_signal(data, candle_idx: int, backcandles: int, gap_window: int, pivots: list[int], zone_height: float, breakout_f: float) -> int:
+    def calc_signal(data, candle_idx: int, backcandles: int, gap_window: int, pivots: PivotIndex, zone_height: float, breakout_f: float, bounces: int = BOUNCES) -> int:
         #print( backcandles, gap_window, zone_height)
 
         # gap_window must be >= pivot window to avoid look ahead bias
@@ -103,13 +161,15 @@ class algo:
 
 
         _F = breakout_f     # breakout factor
-        _N = 3              # number of bounces
+        _N = bounces        # number of bounces
         sig = Signal.NONE
 
+        if _N < 1:
+            raise ValueError(f'bounces must be >= 1, got: {_N}')
+
         cclose = data.close.array[candle_idx]
 
-        lows = data.low.array
-        pvts = algo.get_pivots_low(data=lows[begin:end], pivots=pivots[begin:end])[-_N:]
+        pvts = pivots.last(Pivot.LOW, begin, end, _N).tolist()
 
         if _N == len(pvts):
             sig = algo._check_breakout(
@@ -125,8 +185,7 @@ class algo:
                 return sig
 
 
-        highs = data.high.array
-        pvts = algo.get_pivots_high(data=highs[begin:end], pivots=pivots[begin:end])[-_N:]
+        pvts = pivots.last(Pivot.HIGH, begin, end, _N).tolist()
 
         if _N == len(pvts):
             sig = algo._check_breakout(
@@ -142,3 +201,87 @@ class algo:
 
 
         return sig
+
+
+
+    #
+    # zone means for every candle (vectorized helper for calc_signals)
+    #
+    # the last _N pivots in [begin, end) only change when the window passes
+    # a pivot, so the zone means are calculated once per set of _N
+    # consecutive pivots (see PivotIndex.zones) and then looked up for every
+    # candle
+    #
+    # returns the zone mean per candle, NaN if there's no zone
+    #
+    @staticmethod
+    def _calc_zones(pivots: PivotIndex, highlow: int, begin: np.ndarray, end: np.ndarray, zone_height: float, bounces: int = BOUNCES) -> np.ndarray:
+        _N = bounces
+
+        pos, _ = pivots.get(highlow)
+        means = pivots.zones(highlow, _N, zone_height)
+
+        # number of pivots before end, the first of the last _N must be >= begin
+        k = np.searchsorted(pos, end)
+        first = np.where(k >= _N, k - _N, 0)
+        valid = (k >= _N) & (pos[first] >= begin) if len(pos) > 0 else np.zeros(len(end), dtype=bool)
+
+        return np.where(valid, means[k], np.nan)
+
+
+    #
+    # calculates the signals for all candles in one pass
+    #
+    # high, low, close  numpy arrays with the price data
+    # pivots            the PivotIndex of the pivots or the dense pivot array
+    # (other arguments as in calc_signal)
+    #
+    # returns the same signals as calc_signal for every candle
+    #
+    @staticmethod
+    def calc_signals(high: np.ndarray, low: np.ndarray, close: np.ndarray, pivots, backcandles: int, gap_window: int, zone_height: float, breakout_f: float, bounces: int = BOUNCES) -> np.ndarray:
+        close  = np.asarray(close, dtype=np.float64)
+        pivots = PivotIndex.of(pivots, low, high)
+
+        sz = len(close)
+        signals = np.full(sz, Signal.NONE, dtype=np.int64)
+
+        # candles with a complete window, see calc_signal
+        first = backcandles + gap_window
+        last  = sz - gap_window
+        if first >= last:
+            return signals
+
+        idx   = np.arange(first, last)
+        begin = idx - backcandles - gap_window
+        end   = idx - gap_window
+        cclose = close[first:last]
+
+        mean = algo._calc_zones(pivots, Pivot.LOW, begin, end, zone_height, bounces)
+        sell = (mean - cclose) > zone_height * mean * breakout_f
+
+        mean = algo._calc_zones(pivots, Pivot.HIGH, begin, end, zone_height, bounces)
+        buy = (cclose - mean) > zone_height * mean * breakout_f
+
+        signals[first:last] = np.where(sell, Signal.SELL, np.where(buy, Signal.BUY, Signal.NONE))
+        return signals
+
+
+    #
+    # calculates the signal for every candle in the data feed
+    # (the inputs are the same as for calc_signal)
+    #
+    @staticmethod
+    def calc_signal_array(data, backcandles: int, gap_window: int, pivots, zone_height: float, breakout_f: float, bounces: int = BOUNCES) -> array:
+        signals = algo.calc_signals(
+                        high        = data.high.array,
+                        low         = data.low.array,
+                        close       = data.close.array,
+                        pivots      = pivots,
+                        backcandles = backcandles,
+                        gap_window  = gap_window,
+                        zone_height = zone_height,
+                        breakout_f  = breakout_f,
+                        bounces     = bounces
+                        )
+        return array('i', signals.tolist())
@@ -0,0 +1,275 @@
+import logging
+import multiprocessing
+import os
+
+import pandas as pd
+from pandas import DataFrame
+
+from datetime import datetime
+
+from BreakoutStrategy import BreakoutStrategy
+from breakout import Application, get_loglevel, make_dirs
+from datacache import DataCache
+from pricestore import PriceStore, default_provider
+from pivot import pivot
+from signalcache import SignalCache
+from mtf import MultiTimeframe
+from parameters import RuntimeParameters, PivotParameters, RunParameters, OptimizeParameters, TradingParameters, WalkForwardParameters
+import config
+import optimizer
+import search
+import walkforward
+
+
+pd.options.mode.copy_on_write = True
+
+
+#
+# batch runner, runs one configuration on many tickers
+#
+#   python batch.py 0 -1 conf/opt.json d h 4h w data/other.csv
+#   python batch.py 20200101 20240101 conf/run.json AAPL MSFT ...
+#
+# a ticker is test data (h, d, 5m or a timeframe resampled from them, e.g.
+# 15m, 4h, w; see Application.load_testdata), a csv file (parsed as the test data) or
+# a symbol of the price store. begin and end are bars for test data and
+# files, dates (YYYYMMDD) for symbols
+#
+# the tickers are spread over a pool of worker processes, a worker loads the
+# data, calculates the pivots and runs the mode of the runtime options (run,
+# walkforward or optimize) on it. The workers import pandas, backtrader etc.
+# once and then serve any number of tickers. All per ticker state is in the
+# Job, nothing is taken from the Application class attributes
+#
+# every ticker gives one row of the results table (RESULT_COLUMNS):
+#
+#   run          the metrics of the run section
+#   walkforward  the out of sample metrics, the params of the last fold
+#   optimize     the best combination (sharpe) of the search
+#
+# the table is written to out/<date>-batch-results.csv (tab separated). A
+# ticker that fails gets a row with the error, the others continue
+#
+RESULT_COLUMNS = ['ticker', 'mode', 'bars', 'runs'] + optimizer.RESULT_COLUMNS + ['error']
+
+class Job:
+
+    def __init__(self, ticker: str, begin: str, end: str):
+        self.ticker = ticker
+        self.begin = begin
+        self.end = end
+
+
+    # test data: a source file or a timeframe resampled from one
+    @property
+    def testdata(self) -> str:
+        return self.ticker.lower() if self.ticker in Application.ALIASES else self.ticker
+
+
+    @property
+    def name(self) -> str:
+        if Application.is_testdata(self.ticker):
+            return f'EURUSD_{self.testdata}'
+        if os.path.isfile(self.ticker):
+            return os.path.splitext(os.path.basename(self.ticker))[0]
+        return self.ticker.upper()
+
+
+    def load(self, pivot_window: int, offline: bool) -> DataFrame:
+        if Application.is_testdata(self.ticker):
+            data = Application.load_testdata(self.testdata, int(self.begin), int(self.end))
+
+        elif os.path.isfile(self.ticker):
+            filename = self.ticker
+            data = DataCache(Application.CACHE_DIR).load(filename, lambda: Application.parse_testdata(self.name, filename), variant='batch')
+            b, e = int(self.begin), int(self.end)
+            data = data[b:e] if e not in [-1] else data[b:]
+            data.reset_index(drop=True, inplace=True)
+
+        else:
+            bdate = datetime.strptime(self.begin, '%Y%m%d').date()
+            edate = datetime.strptime(self.end, '%Y%m%d').date()
+            provider = None if offline else default_provider()
+            data = PriceStore(Application.PRICES_DIR, provider).get(self.name, bdate, edate)
+
+        if len(data) == 0:
+            raise Exception(f'No data for ticker: {self.name}')
+
+        data['pivot'] = pivot(data=data, pivot_window=pivot_window)
+        data.set_index("Date", inplace=True, drop=True)
+        return data
+
+
+
+#
+# the combination of the run section
+#
+def run_combination(par: RunParameters) -> dict:
+    return dict(
+        tp_sl_ratio       = par.tp_sl_ratio,
+        sl_distance       = par.sl_distance,
+        backcandles       = par.backcandles,
+        gap_window        = par.gap_window,
+        zone_height       = par.zone_height,
+        breakout_f        = par.breakout_factor,
+        bounces           = par.bounces,
+        trend_filter      = par.trend_filter,
+        ema_period        = par.ema_period,
+        trend_backcandles = par.trend_backcandles
+    )
+
+
+#
+# the mode of the runtime options for a ticker, returns (runs, record)
+#
+def run(data: DataFrame, ticker: str, opt: RuntimeParameters, configuration: config.Config, trading_par: TradingParameters) -> tuple[int, list]:
+    if opt.RUN:
+        par = RunParameters(conf=configuration.run)
+        if par.zone_timeframe is None:
+            signal_cache = SignalCache.from_data(data)
+        else:
+            signal_cache = MultiTimeframe(data, par.zone_timeframe, PivotParameters(conf=configuration.pivot).window)
+        record = optimizer.run_combination(data, trading_par, ticker, signal_cache, run_combination(par))
+        return 1, record
+
+    par = OptimizeParameters(conf=configuration.optim)
+    if par.engine not in ['backtrader', 'kernel']:
+        raise ValueError(f"batch: unknown engine '{par.engine}', expected one of: 'backtrader', 'kernel'")
+
+    if opt.WALKFORWARD:
+        # the folds of a ticker run in the worker, the pool is over the tickers
+        wf_par = WalkForwardParameters(conf=configuration.walkforward)
+        wf_par.workers = 1
+
+        done = walkforward.walk_forward(data, par, wf_par, trading_par, ticker)
+        curve = walkforward.equity(data, done, trading_par.amount)
+
+        n = len(optimizer.PARAM_KEYS)
+        return len(done), done[-1].insample[:n] + list(walkforward.summary(curve, trading_par.amount))
+
+    # runs on the workers of the batch, never a nested pool
+    def _evaluate(todo: list[dict], bars: int) -> list[list]:
+        window = data if bars is None else data.iloc[:bars]
+        return list(optimizer.evaluate(par.engine, 1, window, todo, trading_par, ticker))
+
+    records = search.search(par, _evaluate, bars=len(data))
+    if not records:
+        raise ValueError('batch: no runs')
+    return len(records), max(records, key=search.score)
+
+
+
+#
+# worker process state, set by _init_worker
+#
+_worker = dict()
+
+def _init_worker(configfile: str, offline: bool, verbose: bool, log_level: int):
+    logging.getLogger().setLevel(log_level)
+
+    configuration = config.load_config(configfile)
+    trading = TradingParameters(conf=configuration.trading)
+
+    BreakoutStrategy.LONG = trading.plong
+    BreakoutStrategy.SHORT = trading.pshort
+    BreakoutStrategy.VERBOSE = verbose
+
+    _worker['config'] = configuration
+    _worker['runtime'] = RuntimeParameters(configuration.runtime)
+    _worker['pivot'] = PivotParameters(configuration.pivot)
+    _worker['trading'] = trading
+    _worker['offline'] = offline
+
+
+def mode(opt: RuntimeParameters) -> str:
+    return 'run' if opt.RUN else 'walkforward' if opt.WALKFORWARD else 'optimize'
+
+
+def _run_worker(job: Job) -> list:
+    opt = _worker['runtime']
+    bars = None
+    try:
+        data = job.load(_worker['pivot'].window, _worker['offline'])
+        bars = len(data)
+        runs, record = run(data, job.name, opt, _worker['config'], _worker['trading'])
+        return [job.name, mode(opt), bars, runs] + record + [None]
+
+    except Exception as e:
+        logging.getLogger().error(f'batch: {job.name}: {e}')
+        return [job.name, mode(opt), bars, 0] + [None] * len(optimizer.RESULT_COLUMNS) + [str(e)]
+
+
+
+#
+# runs the jobs over a pool of workers, returns the results table in the
+# order of the jobs
+#
+def run_batch(jobs: list[Job], configfile: str, workers: int, offline: bool = False, verbose: bool = False, log_level: int = logging.INFO) -> DataFrame:
+    workers = max(1, min(optimizer.cpu_count(workers), len(jobs)))
+    logging.getLogger().info(f'batch: {len(jobs)} tickers on {workers} workers\n')
+
+    initargs = (configfile, offline, verbose, log_level)
+    rows = []
+
+    def _done(row: list):
+        print(f"{row[0]}: {'error: ' + row[-1] if row[-1] else 'sharpe: ' + str(row[-2])}")
+        rows.append(row)
+
+    if workers == 1:
+        _init_worker(*initargs)
+        for job in jobs:
+            _done(_run_worker(job))
+    else:
+        with multiprocessing.Pool(processes=workers, initializer=_init_worker, initargs=initargs) as pool:
+            for row in pool.imap(_run_worker, jobs, chunksize=1):
+                _done(row)
+
+    return DataFrame(rows, columns=RESULT_COLUMNS)
+
+
+
+def get_args():
+    import argparse
+    p = argparse.ArgumentParser()
+    p.add_argument("begin", help="for test data and files, first bar (numeric), else start date")
+    p.add_argument("end", help="for test data and files, stop bar (e=-1 indicates e is ignored), else stop date")
+    p.add_argument("config", help="configuration file (json)")
+    p.add_argument("tickers", nargs="+", help="test data (h, d, 5m), csv files or symbols")
+
+    p.add_argument("-w", "--workers", type=int, default=0, help="number of processes (default 0: all cores)")
+    p.add_argument("-v", "--verbose", action="store_true", help="print stuff on the console")
+    p.add_argument("--offline", action="store_true", help="use the local price store only, don't download")
+    p.add_argument("-log", "--loglevel",
+                   choices=['debug', 'DEBUG', 'info', 'INFO', 'warning', 'WARNING', 'error', 'ERROR'],
+                   help="loglevel (default=INFO)")
+
+    return p.parse_args()
+
+
+
+if __name__ == '__main__':
+    args = get_args()
+
+    Application.VERBOSE = args.verbose
+    Application.log_level = get_loglevel(args.loglevel)
+    Application.initialize()
+
+    Application.logger.info("START batch")
+    try:
+        jobs = [Job(x, args.begin, args.end) for x in args.tickers]
+        results = run_batch(jobs, args.config, args.workers, offline=args.offline, verbose=args.verbose, log_level=Application.log_level)
+
+        make_dirs(Application.OUTPUT_DIR)
+        results.to_csv(f'{Application.OUTPUT_DIR}/{Application.NOW.date().strftime("%Y%m%d")}-batch-results.csv', sep='\t', index=False)
+
+        print()
+        print(results)
+        print('\ndone.')
+
+    except Exception as e:
+        import traceback
+        print(f'something\'s wrong: {e}')
+        print(traceback.format_exc())
+        Application.logger.error(e)
+    finally:
+        Application.logger.info("done.")
@@ -0,0 +1,401 @@
+import contextlib
+import gc
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+from algo import algo
+from pivot import Pivot, PivotIndex, pivot
+from signalengine import SignalEngine
+from parameters import RunParameters, OptimizeParameters, TradingParameters
+from breakout import Application
+import kernel
+import optimizer
+
+
+#
+# benchmarks of the hot paths
+#
+#   python bench.py [--sizes 10000 100000 1000000] [--baseline out/bench-old.json] [--threshold 0.2] [--memory]
+#
+# every benchmark runs on data/eurusd_d.csv and on synthetic random walks of
+# the given sizes (benchmarks of the backtrader engine are limited to
+# MAX_BARS_BACKTRADER bars, the per candle calc_signal loop to
+# MAX_BARS_PER_CANDLE bars). Reported per benchmark and data set: wall time
+# (best of --repeat), bars per second and peak traced memory (tracemalloc,
+# separate run). The report is written as JSON; with --baseline the wall
+# times are compared and the exit code is 1 if one is slower than the
+# baseline by more than the threshold. With --memory optimizations of a
+# growing number of runs are measured (once, on the first MEMORY_BARS bars),
+# the exit code is 1 if their peak memory grows with the number of runs
+# (MEMORY_GROWTH)
+#
+
+DATAFILE = 'data/eurusd_d.csv'
+SIZES = [10_000, 100_000, 1_000_000]
+MAX_BARS_BACKTRADER = 10_000
+MAX_BARS_PER_CANDLE = 100_000
+
+# optimize_memory: peak memory of optimizations with a growing number of
+# runs, the peak of the longest may be at most MEMORY_GROWTH times the
+# peak of the shortest. Every run is a backtrader run, so they are kept
+# short: MEMORY_BARS bars, no best of --repeat
+MEMORY_RUNS = [2, 8, 32]
+MEMORY_BARS = 2_000
+MEMORY_GROWTH = 1.25
+
+PIVOT_WINDOW = Pivot.WINDOW
+BACKCANDLES = 40
+GAP_WINDOW = Pivot.WINDOW + 1
+ZONE_HEIGHT = 0.001
+BREAKOUT_F = 1.0
+TP_SL_RATIO = 2.0
+SL_DISTANCE = 0.025
+TREND_BACKCANDLES = 10
+
+
+
+#
+# data sets
+#
+def load_eurusd() -> DataFrame:
+    data = pd.read_csv(DATAFILE)
+    data = data.rename({"Gmt time": "Date"}, axis = 1)
+    data['Date'] = pd.to_datetime(data['Date'], format="%d.%m.%Y %H:%M:%S.%f")
+    return data.set_index('Date')
+
+
+#
+# random walk with OHLC bars, same seed for every run
+#
+def synthetic(size: int, seed: int = 0) -> DataFrame:
+    rng = np.random.default_rng(seed)
+    close = 1.1 * np.exp(np.cumsum(rng.normal(0.0, 0.003, size)))
+    open = np.concatenate(([close[0]], close[:-1]))
+    high = np.maximum(open, close) * (1.0 + np.abs(rng.normal(0.0, 0.002, size)))
+    low  = np.minimum(open, close) * (1.0 - np.abs(rng.normal(0.0, 0.002, size)))
+    volume = rng.integers(1, 1000, size).astype(np.float64)
+
+    dates = pd.date_range('2000-01-01', periods=size, freq='h')
+    return DataFrame(dict(Open=open, High=high, Low=low, Close=close, Volume=volume), index=pd.Index(dates, name='Date'))
+
+
+def with_pivots(data: DataFrame) -> DataFrame:
+    data = data.copy()
+    data['pivot'] = pivot(data=data, pivot_window=PIVOT_WINDOW)
+    return data
+
+
+
+#
+# the benchmarks, each takes the data (with pivots) and returns a function
+# to time, the set up isn't timed
+#
+def bench_pivot(data: DataFrame):
+    return lambda: pivot(data=data, pivot_window=PIVOT_WINDOW)
+
+
+def bench_calc_signals(data: DataFrame):
+    high, low, close, pivots = (data[c].to_numpy() for c in ['High', 'Low', 'Close', 'pivot'])
+    return lambda: algo.calc_signals(high, low, close, pivots, BACKCANDLES, GAP_WINDOW, ZONE_HEIGHT, BREAKOUT_F)
+
+
+# the window queries of algo.calc_signal (last BOUNCES lows and highs per candle)
+def bench_pivot_index(data: DataFrame):
+    index = PivotIndex(*(data[c].to_numpy() for c in ['pivot', 'Low', 'High']))
+    windows = [(i - BACKCANDLES - GAP_WINDOW, i - GAP_WINDOW) for i in range(BACKCANDLES + GAP_WINDOW, len(data))]
+
+    def _run():
+        for begin, end in windows:
+            index.last(Pivot.LOW, begin, end, algo.BOUNCES)
+            index.last(Pivot.HIGH, begin, end, algo.BOUNCES)
+    return _run
+
+
+# the parts of a backtrader data feed algo.calc_signal reads
+class Feed:
+
+    def __init__(self, close: np.ndarray):
+        self.close = SimpleNamespace(array=close)
+
+    def buflen(self) -> int:
+        return len(self.close.array)
+
+
+# the per candle reference of calc_signals, as BreakoutStrategy calls it
+# when it isn't given signals
+def bench_calc_signal(data: DataFrame):
+    feed = Feed(data['Close'].to_numpy())
+    index = PivotIndex(*(data[c].to_numpy() for c in ['pivot', 'Low', 'High']))
+
+    def _run():
+        for i in range(len(data)):
+            algo.calc_signal(feed, i, BACKCANDLES, GAP_WINDOW, index, ZONE_HEIGHT, BREAKOUT_F)
+    return _run
+
+
+def bench_signal_engine(data: DataFrame):
+    bars = list(zip(data['Open'].tolist(), data['High'].tolist(), data['Low'].tolist(), data['Close'].tolist()))
+
+    def _run():
+        engine = SignalEngine(PIVOT_WINDOW, BACKCANDLES, GAP_WINDOW, ZONE_HEIGHT, BREAKOUT_F)
+        for open, high, low, close in bars:
+            engine.append(open, high, low, close)
+    return _run
+
+
+def bench_is_trend(data: DataFrame):
+    close = data['Close'].to_numpy()
+    open  = data['Open'].to_numpy()
+    ema   = data['Close'].ewm(span=TREND_BACKCANDLES, adjust=False).mean().to_numpy()
+    return lambda: algo.is_trend(close, open, ema, backcandles=TREND_BACKCANDLES)
+
+
+def bench_calc_trends(data: DataFrame):
+    close = data['Close'].to_numpy()
+    open  = data['Open'].to_numpy()
+    ema   = data['Close'].ewm(span=TREND_BACKCANDLES, adjust=False).mean().to_numpy()
+    return lambda: algo.calc_trends(close, open, ema, backcandles=TREND_BACKCANDLES)
+
+
+def bench_kernel(data: DataFrame):
+    signals = bench_calc_signals(data)()
+    dates = data.index.to_numpy()
+    trading_par = TradingParameters(None)
+    columns = [data[c].to_numpy() for c in ['Open', 'High', 'Low', 'Close']]
+    return lambda: kernel.backtest(*columns, signals, dates, TP_SL_RATIO, SL_DISTANCE, trading_par)
+
+
+# a single backtrader run, includes the signal generation of BreakoutStrategy.__init__
+def bench_backtest(data: DataFrame):
+    combination = dict(tp_sl_ratio=TP_SL_RATIO, sl_distance=SL_DISTANCE, backcandles=BACKCANDLES,
+                       gap_window=GAP_WINDOW, zone_height=ZONE_HEIGHT, breakout_f=BREAKOUT_F)
+    return lambda: optimizer.run_combination(data, TradingParameters(None), 'BENCH', None, combination)
+
+
+# a small optimization (4 runs, 2 signal configurations) with backtrader
+def bench_optimize(data: DataFrame):
+    todo = [dict(tp_sl_ratio=tp, sl_distance=SL_DISTANCE, backcandles=bc, gap_window=GAP_WINDOW, zone_height=ZONE_HEIGHT, breakout_f=BREAKOUT_F)
+                for tp in [1.5, TP_SL_RATIO] for bc in [BACKCANDLES, BACKCANDLES + 1]]
+    return lambda: list(optimizer.optimize_serial(data, todo, TradingParameters(None), 'BENCH'))
+
+
+# Application.run with the default run and trading parameters (the cerebro
+# with the analyzers and their results)
+def bench_app_run(data: DataFrame):
+    Application.ticker = 'BENCH'
+    return lambda: Application.run(data, RunParameters(None), TradingParameters(None))
+
+
+# Application.optimize of a small grid with the kernel engine (search, results
+# file, no result cache), the results file is written to a temporary directory
+def bench_app_optimize(data: DataFrame):
+    par = OptimizeParameters(None)
+    par.engine = 'kernel'
+    par.resume = False
+    par.cache = False
+    par.tp_sl_ratio = [1.5, TP_SL_RATIO]
+    par.sl_distance = [SL_DISTANCE]
+    par.breakout_factor = [BREAKOUT_F]
+
+    Application.ticker = 'BENCH'
+
+    def _run():
+        output_dir = Application.OUTPUT_DIR
+        with tempfile.TemporaryDirectory(prefix='bench-') as tmp:
+            Application.OUTPUT_DIR = tmp
+            try:
+                Application.optimize(data, par, TradingParameters(None))
+            finally:
+                Application.OUTPUT_DIR = output_dir
+    return _run
+
+
+# optimizations of 'runs' combinations (2 signal configurations), the peak
+# memory must not depend on the number of runs
+def bench_optimize_runs(runs: int):
+    def _setup(data: DataFrame):
+        todo = [dict(tp_sl_ratio=1.5 + i / 100, sl_distance=SL_DISTANCE, backcandles=BACKCANDLES + i % 2, gap_window=GAP_WINDOW, zone_height=ZONE_HEIGHT, breakout_f=BREAKOUT_F)
+                    for i in range(runs)]
+        return lambda: list(optimizer.optimize_serial(data, todo, TradingParameters(None), 'BENCH'))
+    return _setup
+
+
+# name: (set up, max number of bars)
+BENCHMARKS = {
+    'pivot':         (bench_pivot,         None),
+    'calc_signals':  (bench_calc_signals,  None),
+    'calc_signal':   (bench_calc_signal,   MAX_BARS_PER_CANDLE),
+    'pivot_index':   (bench_pivot_index,   None),
+    'signal_engine': (bench_signal_engine, None),
+    'is_trend':      (bench_is_trend,      None),
+    'calc_trends':   (bench_calc_trends,   None),
+    'kernel':        (bench_kernel,        None),
+    'backtest':      (bench_backtest,      MAX_BARS_BACKTRADER),
+    'optimize':      (bench_optimize,      MAX_BARS_BACKTRADER),
+    'app_run':       (bench_app_run,       MAX_BARS_BACKTRADER),
+    'app_optimize':  (bench_app_optimize,  None),
+}
+
+MEMORY_BENCHMARKS = [f'optimize_memory_{n}' for n in MEMORY_RUNS]
+for n, name in zip(MEMORY_RUNS, MEMORY_BENCHMARKS):
+    BENCHMARKS[name] = (bench_optimize_runs(n), MAX_BARS_BACKTRADER)
+
+
+
+#
+# best wall time of repeat runs and the peak traced memory of one more run,
+# the output of the benchmarked code (e.g. the strategy) is suppressed
+#
+def measure(fn, repeat: int) -> tuple[float, float]:
+    with contextlib.redirect_stdout(io.StringIO()):
+        return _measure(fn, repeat)
+
+
+def _measure(fn, repeat: int) -> tuple[float, float]:
+    wall = float('inf')
+    for _ in range(repeat):
+        gc.collect()
+        t = time.perf_counter()
+        fn()
+        wall = min(wall, time.perf_counter() - t)
+
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return wall, peak
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(names: list[str], sizes: list[int], repeat: int) -> dict:
+    datasets = [('eurusd_d', load_eurusd())] + [(f'synthetic-{n}', synthetic(n)) for n in sizes]
+
+    results = dict()
+    for label, data in datasets:
+        data = with_pivots(data)
+        for name in names:
+            setup, max_bars = BENCHMARKS[name]
+            if max_bars is not None and len(data) > max_bars:
+                continue
+
+            if name in MEMORY_BENCHMARKS:
+                wall, peak = measure(setup(data.iloc[:MEMORY_BARS]), 1)
+                bars = min(len(data), MEMORY_BARS)
+            else:
+                wall, peak = measure(setup(data), repeat)
+                bars = len(data)
+
+            key = f'{name}/{label}'
+            results[key] = dict(bars=bars, wall=wall, bars_per_s=bars / wall, peak_mb=peak / 2**20)
+            print(f'{key:32s} {bars:9d} bars {wall:10.4f} s {bars / wall:14.0f} bars/s {peak / 2**20:10.1f} MB', flush=True)
+
+    return results
+
+
+#
+# optimize_memory: the peak memory of the longest optimization relative to the
+# shortest, per data set, as (data set, peak shortest, peak longest)
+#
+def memory_growth(results: dict) -> list[tuple[str, float, float]]:
+    first, last = MEMORY_BENCHMARKS[0], MEMORY_BENCHMARKS[-1]
+    growth = []
+    for key, result in results.items():
+        name, label = key.split('/', 1)
+        if name == first and f'{last}/{label}' in results:
+            growth.append((label, result['peak_mb'], results[f'{last}/{label}']['peak_mb']))
+    return growth
+
+
+#
+# benchmarks that are slower than in the baseline by more than threshold
+# (relative), as (name, baseline wall, wall)
+#
+def regressions(results: dict, baseline: dict, threshold: float) -> list[tuple[str, float, float]]:
+    slower = []
+    for key, result in results.items():
+        base = baseline.get(key)
+        if base is not None and result['wall'] > base['wall'] * (1.0 + threshold):
+            slower.append((key, base['wall'], result['wall']))
+    return slower
+
+
+
+def get_args():
+    import argparse
+    p = argparse.ArgumentParser(description="benchmarks of the pivot, signal and backtest hot paths")
+    p.add_argument("--sizes", type=int, nargs='*', default=SIZES, help="bars of the synthetic series")
+    p.add_argument("--only", nargs='*', choices=list(BENCHMARKS), default=[x for x in BENCHMARKS if x not in MEMORY_BENCHMARKS], help="benchmarks to run")
+    p.add_argument("--memory", action="store_true", help=f"also run the optimize_memory benchmarks ({', '.join(str(x) for x in MEMORY_RUNS)} runs)")
+    p.add_argument("--repeat", type=int, default=3, help="runs per benchmark, the best time is reported")
+    p.add_argument("--out", default=None, help="JSON report (default: out/bench-<commit>.json)")
+    p.add_argument("--baseline", default=None, help="JSON report to compare with")
+    p.add_argument("--threshold", type=float, default=0.2, help="allowed relative slow down (default 0.2 = 20%%)")
+    return p.parse_args()
+
+
+if __name__ == '__main__':
+    args = get_args()
+
+    commit = git_commit()
+    report = dict(
+        meta = dict(
+            commit  = commit,
+            python  = platform.python_version(),
+            numpy   = np.__version__,
+            pandas  = pd.__version__,
+            machine = platform.machine(),
+            repeat  = args.repeat,
+        ),
+        results = run_benchmarks(args.only + (MEMORY_BENCHMARKS if args.memory else []), args.sizes, args.repeat)
+    )
+
+    out = args.out or f'out/bench-{commit or "local"}.json'
+    if os.path.dirname(out):
+        os.makedirs(os.path.dirname(out), exist_ok=True)
+    with open(out, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'\nreport: {out}')
+
+    failed = False
+    for label, first, last in memory_growth(report['results']):
+        print(f'optimize memory {label}: {MEMORY_RUNS[0]} runs {first:.1f} MB, {MEMORY_RUNS[-1]} runs {last:.1f} MB (x{last / first:.2f})')
+        if last > first * MEMORY_GROWTH:
+            print(f'MEMORY GROWTH {label}: more than x{MEMORY_GROWTH} for {MEMORY_RUNS[-1] // MEMORY_RUNS[0]} times the runs')
+            failed = True
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)['results']
+
+        slower = regressions(report['results'], baseline, args.threshold)
+        for key, base, wall in slower:
+            print(f'REGRESSION {key}: {base:.4f} s -> {wall:.4f} s ({100.0 * (wall / base - 1.0):+.1f}%)')
+
+        failed = failed or bool(slower)
+        if not slower:
+            print(f'no regressions (threshold {100.0 * args.threshold:.0f}%)')
+
+    if failed:
+        sys.exit(1)
@@ -1,23 +1,23 @@
 import logging
 import os
+import sys
 
-import yfinance as yf
 import pandas as pd
 from pandas import DataFrame
 
 from datetime import datetime
 
 
-from backtrader import Cerebro
-from backtrader.sizers import PercentSizer
-from backtrader.feeds import PandasData
-from backtrader.analyzers import SharpeRatio, DrawDown, Returns
-
-from BreakoutStrategy import BreakoutStrategy
+# backtrader, plotly, yfinance and the optimizer are imported on the code
+# paths that use them (see --profile-startup)
+from datacache import DataCache
+import resample
+from pricestore import PriceStore, default_provider
 from pivot import *
+import profiler
 
 
-from parameters import RuntimeParameters, PivotParameters, RunParameters, OptimizeParameters, TradingParameters
+from parameters import RuntimeParameters, PivotParameters, RunParameters, OptimizeParameters, TradingParameters, WalkForwardParameters
 
 
 pd.options.mode.copy_on_write = True
@@ -35,8 +35,12 @@ class Application :
     CONFIG_DIR = 'conf'
     OUTPUT_DIR = 'out'
     LOGGING_DIR = 'log'
+    CACHE_DIR = DataCache.DIR
+    PRICES_DIR = PriceStore.DIR
 
     VERBOSE = False
+    OFFLINE = False
+    STREAMING = False
     NOW = pd.Timestamp.today().replace(microsecond=0)
 
     logger = logging.getLogger()
@@ -61,10 +65,30 @@ class Application :
         Application.logger.setLevel(Application.log_level)
 
 
+    #
+    # the modules a configuration imports, in the order of the code path
+    #
     @staticmethod
-    def load_testdata(ticker: str, b, e) -> DataFrame:
+    def startup_stages(testdata: bool, opt: RuntimeParameters) -> list[str]:
+        stages = ['breakout']
+        if not testdata and not Application.OFFLINE:
+            stages.append('yfinance')
+        if opt.PLOTTING:
+            stages.append('plotting')
+
+        if opt.RUN:
+            stages.extend(['backtrader', 'BreakoutStrategy'])
+        elif opt.WALKFORWARD:
+            stages.extend(['optimizer', 'search', 'walkforward'])
+        elif opt.OPTIMIZE:
+            stages.extend(['optimizer', 'search', 'results'])
+        return stages
+
+
+    @staticmethod
+    def parse_testdata(ticker: str, filename: str) -> DataFrame:
         delimiter = ';' if ticker in ['5m', '5M'] else ','
-        data = pd.read_csv(f'data/eurusd_{ticker}.csv', delimiter=delimiter)
+        data = pd.read_csv(filename, delimiter=delimiter)
         if not 'Date' in data.columns:
             data = data.rename({"Gmt time": "Date"}, axis = 1)
             data.Date = pd.to_datetime(data.Date, format="%d.%m.%Y %H:%M:%S.%f")
@@ -74,11 +98,63 @@ class Application :
             data.Date = pd.to_datetime(data['Date'] + ' ' + data['Time'], format='%d/%m/%Y %H:%M:%S')
             data = data.drop(columns=['Time'])
 
-        data.set_index("Date")
+        return data
+
+
+    #
+    # test data: the files data/eurusd_<source>.csv (SOURCES, finest first)
+    # and any timeframe (see resample.py, e.g. 15m, 4h, w) built from the
+    # finest source file that divides it, without preparing new files
+    #
+    SOURCES = ['5m', 'h', 'd']
+    ALIASES = ['5M', 'H', 'D']
+
+    @staticmethod
+    def is_testdata(ticker: str) -> bool:
+        return ticker in Application.SOURCES or ticker in Application.ALIASES or resample.seconds(ticker) is not None
+
+
+    @staticmethod
+    def testdata_file(source: str) -> str:
+        return f'data/eurusd_{source}.csv'
+
+
+    # the finest source file for timeframe, None if there is none
+    @staticmethod
+    def testdata_source(timeframe: str) -> str:
+        seconds = resample.seconds(timeframe)
+        for source in Application.SOURCES:
+            if seconds % resample.seconds(source) == 0 and os.path.isfile(Application.testdata_file(source)):
+                return source
+        return None
 
-        # remove empty data
-        if ticker == 'h':
-            data = data[data['Volume'] != 0]
+
+    @staticmethod
+    def load_source(source: str) -> DataFrame:
+        filename = Application.testdata_file(source)
+
+        # parsed data is cached (memory mapped columns), see DataCache
+        return DataCache(Application.CACHE_DIR).load(filename, lambda: Application.parse_testdata(source, filename), variant=source)
+
+
+    @staticmethod
+    def load_testdata(ticker: str, b, e) -> DataFrame:
+        if ticker in Application.SOURCES:
+            data = Application.load_source(ticker)
+
+            # remove empty data
+            if ticker == 'h':
+                data = resample.drop_empty(data)
+        else:
+            source = Application.testdata_source(ticker)
+            if source is None:
+                raise Exception(f'No source data for timeframe: {ticker}')
+
+            # the bars are cached like parsed data, keyed by the source file
+            # and the timeframe (invalidated when the source file changes)
+            data = DataCache(Application.CACHE_DIR).load(Application.testdata_file(source),
+                                                         lambda: resample.resample(Application.load_source(source), resample.seconds(ticker)),
+                                                         variant=f'{source}-{ticker}')
 
         data = data[b:e] if e not in [-1] else data[b:]
         data.reset_index(drop=True, inplace=True)
@@ -89,10 +165,9 @@ class Application :
 
     @staticmethod
     def fetch_data(ticker: str, b: int, e: int) -> DataFrame:
-        data = yf.download(ticker, start=b, end=e)
-        data.reset_index(inplace = True, drop = False)
-        if "Date" in data.columns:
-            data.set_index("Date")
+        # served from the local price store, only missing ranges are downloaded
+        provider = None if Application.OFFLINE else default_provider()
+        data = PriceStore(Application.PRICES_DIR, provider).get(ticker, b, e)
 
         if len(data) == 0:
             raise Exception(f'No data for ticker: {ticker}')
@@ -113,86 +188,203 @@ class Application :
         pass
 
 
+    # directory of a columnar export (see export.py)
     @staticmethod
-    def save_optim_results(results):
-        par_list = [
-                [   x[0].params.tp_sl_ratio,
-                    x[0].params.sl_distance,
-                    x[0].params.backcandles,
-                    x[0].params.gap_window,
-                    x[0].params.zone_height,
-                    x[0].params.breakout_f,
-
-                    x[0].analyzers.returns.get_analysis()['rtot'],
-                    x[0].analyzers.returns.get_analysis()['rnorm100'],
-                    x[0].analyzers.drawdown.get_analysis()['max']['drawdown'],
-                    x[0].analyzers.sharpe.get_analysis()['sharperatio']
-                ] for x in results
-            ]
-
-        par_df = DataFrame(par_list, columns = ['tp-sl', 'stoploss-d', 'back', 'gap', 'zone-height', 'bof', 'total', 'yearly', 'max-dd', 'sharpe'])
-        par_df.to_csv(f'out/{Application.ticker}-{Application.NOW.date().strftime("%Y%m%d")}-results.csv')
+    def export_path(name: str) -> str:
+        return f'{Application.OUTPUT_DIR}/{Application.NOW.date().strftime("%Y%m%d")}_{Application.ticker}_{name}'
 
 
+    @staticmethod
+    def results_file() -> str:
+        return f'{Application.OUTPUT_DIR}/{Application.ticker}-{Application.NOW.date().strftime("%Y%m%d")}-results.csv'
 
-    from backtrader.sizers import PercentSizer
 
     @staticmethod
     def optimize(data: DataFrame, par: OptimizeParameters, trading_par: TradingParameters):
+        from BreakoutStrategy import BreakoutStrategy
+        from results import ResultWriter
+        from resultcache import ResultCache
+        import optimizer
+        import search
+
         Application.logger.info(f'optimize: {Application.ticker}...\n')
-        pivots = data['pivot'].array._ndarray
-        pdata = PandasData(dataname=data, datetime=None, open=0, high=1, low=2, close=3, volume=4, openinterest=-1)
 
-        Application.logger.info(f'optimize: init cerebro...\n')
-        cerebro = Cerebro(stdstats=True)
+        if par.engine not in ['backtrader', 'kernel']:
+            raise ValueError(f"optimize: unknown engine '{par.engine}', expected one of: 'backtrader', 'kernel'")
 
-        cerebro.broker.setcash(trading_par.amount)
-        cerebro.broker.setcommission(trading_par.commission)
-        cerebro.addsizer(PercentSizer, percents = 100 * trading_par.size)
+        if par.search not in search.STRATEGIES:
+            raise ValueError(f"optimize: unknown search '{par.search}', expected one of: {', '.join(search.STRATEGIES)}")
 
         BreakoutStrategy.LONG = trading_par.plong
         BreakoutStrategy.SHORT = trading_par.pshort
         BreakoutStrategy.VERBOSE = Application.VERBOSE
 
+        # results are written as soon as a run is finished, runs that are
+        # already in the results file (of the same data) are skipped, runs
+        # in the result cache (of any earlier optimization) are copied
+        run = optimizer.run_description(data, par, trading_par)
+        cache = None
+        if par.cache:
+            cache = ResultCache(dict(run, pivot_window=Application.pivot_window, engine=par.engine), len(optimizer.PARAM_KEYS), max_size=par.cache_size)
+
+        with ResultWriter(Application.results_file(), optimizer.RESULT_COLUMNS, len(optimizer.PARAM_KEYS), run, resume=par.resume) as writer:
+            workers = optimizer.cpu_count(par.workers)
+
+            space = search.SearchSpace(par)
+            runs = len(space) if par.search == 'grid' else min(par.budget, len(space))
+            cached = len(cache) if cache is not None else 0
+            print(f"optimize ({par.engine}, {par.search}), combinations: {len(space)}, runs: {runs}, in results file: {writer.rows}, in cache: {cached}, workers: {workers}\n")
+
+            # the kernel records are kept for the crosscheck
+            checked = []
+
+            # runs the combinations on the first 'bars' bars, or on all data
+            # (bars is None) and then the records are written
+            def _evaluate(todo: list[dict], bars: int) -> list[list]:
+                if bars is not None:
+                    return list(optimizer.evaluate(par.engine, workers, data.iloc[:bars], todo, trading_par, Application.ticker))
+
+                missing = [x for x in todo if not writer.has(optimizer.params(x))]
+                if cache is not None:
+                    for combination in missing:
+                        record = cache.get(optimizer.params(combination))
+                        if record is not None:
+                            writer.write(record)
+                    missing = [x for x in missing if not writer.has(optimizer.params(x))]
+
+                records = optimizer.evaluate(par.engine, workers, data, missing, trading_par, Application.ticker)
+                for combination, record in zip(missing, records):
+                    with profiler.stage('save'):
+                        writer.write(record)
+                        if cache is not None:
+                            cache.put(record)
+                    if par.engine == 'kernel' and par.crosscheck > 0:
+                        checked.append((combination, record))
+
+                n = len(optimizer.PARAM_KEYS)
+                return [optimizer.params(x) + writer.get(optimizer.params(x))[n:] for x in todo]
+
+            batch = workers if par.engine == 'backtrader' else 1
+            try:
+                records = search.search(par, _evaluate, bars=len(data), batch=batch)
+            finally:
+                if cache is not None:
+                    cache.close()
+                    print(f"result cache: {cache.hits} runs reused")
+
+        if checked:
+            mismatches = optimizer.crosscheck(data, trading_par, Application.ticker, [x[0] for x in checked], [x[1] for x in checked], par.crosscheck)
+            print(f"crosscheck with backtrader: {min(par.crosscheck, len(checked))} runs, {mismatches} mismatches")
+
+        if records:
+            best = max(records, key=search.score)
+            print(f"best sharpe: {best[-1]} ({', '.join(f'{k}={v}' for k, v in zip(optimizer.PARAM_KEYS, best))})")
 
-        cerebro.adddata(data=pdata)
+        print('\ndone.')
 
-        Application.logger.info(f'optimize: adding strategy...\n')
 
-        strats = cerebro.optstrategy(
-            BreakoutStrategy,
-                ticker       = (Application.ticker,),
+    @staticmethod
+    def walkforward(data: DataFrame, par: OptimizeParameters, wf_par: WalkForwardParameters, trading_par: TradingParameters):
+        from BreakoutStrategy import BreakoutStrategy
+        import search
+        import walkforward
 
-                tp_sl_ratio  = par.tp_sl_ratio,
-                sl_distance  = par.sl_distance,
-                backcandles  = par.backcandles,
-                gap_window   = par.gap_window,
-                zone_height  = par.zone_height,
-                breakout_f   = par.breakout_factor,
+        Application.logger.info(f'walkforward: {Application.ticker}...\n')
 
-                pivots       = (pivots,)
-            )
+        if par.engine not in ['backtrader', 'kernel']:
+            raise ValueError(f"walkforward: unknown engine '{par.engine}', expected one of: 'backtrader', 'kernel'")
 
-        runs = len(par.tp_sl_ratio) * len(par.sl_distance) * len(par.backcandles) * len(par.gap_window) * len(par.zone_height)
-        print(f"optimize, total number of runs: {runs}\n")
-        Application.logger.info(f'optimize: cerebro...{runs}\n')
+        if par.search not in search.STRATEGIES:
+            raise ValueError(f"walkforward: unknown search '{par.search}', expected one of: {', '.join(search.STRATEGIES)}")
 
-        cerebro.addanalyzer(SharpeRatio, _name = "sharpe")
-        cerebro.addanalyzer(DrawDown, _name = "drawdown")
-        cerebro.addanalyzer(Returns, _name = "returns")
+        BreakoutStrategy.LONG = trading_par.plong
+        BreakoutStrategy.SHORT = trading_par.pshort
+        BreakoutStrategy.VERBOSE = Application.VERBOSE
 
-        results = cerebro.run(maxcpus=1)
-        Application.save_optim_results(results)
+        print(f"walkforward ({par.engine}, {par.search}), train: {wf_par.train}, test: {wf_par.test}, {'anchored' if wf_par.anchored else 'rolling'}\n")
+        done = walkforward.walk_forward(data, par, wf_par, trading_par, Application.ticker)
+
+        folds = DataFrame(walkforward.fold_records(data, done), columns=walkforward.FOLD_COLUMNS)
+        folds.to_csv(Application.get_filename('walkforward'), sep='\t', index=False)
+        print(folds)
+
+        curve = walkforward.equity(data, done, trading_par.amount)
+        curve.to_csv(Application.get_filename('walkforward_equity'), sep='\t')
+
+        rtot, rnorm100, maxdd, sharpe = walkforward.summary(curve, trading_par.amount)
+        print(f"\nout of sample: \t{curve.index[0]} - {curve.index[-1]}\nend value: \t{curve['value'].iloc[-1]:8.2f}\ntotal: \t{rtot}\nyearly: \t{rnorm100}\nmax-dd: \t{maxdd}\nsharpe: \t{sharpe}")
 
         print('\ndone.')
 
 
+    #
+    # the stage timings (and the cProfile statistics) of this invocation
+    #
+    @staticmethod
+    def write_profile(cprof = None):
+        profiler.write(Application.export_path('profile') + '.json', meta=dict(ticker=Application.ticker, now=str(Application.NOW)))
+
+        if cprof is not None:
+            import pstats
+            cprof.disable()
+            path = Application.export_path('profile') + '.pstats'
+            cprof.dump_stats(path)
+            pstats.Stats(cprof).sort_stats('cumulative').print_stats(25)
+            print(f'cprofile: {path}')
+
+
+    #
+    # the zones of the higher timeframe of the run section (see mtf.py), None
+    # if the zones are taken from the data itself
+    #
+    @staticmethod
+    def zones(data: DataFrame, par: RunParameters):
+        if par.zone_timeframe is None:
+            return None
+
+        from mtf import MultiTimeframe
+        with profiler.stage('pivots'):
+            return MultiTimeframe(data, par.zone_timeframe, Application.pivot_window)
+
+
+    #
+    # the signals of the run section per bar (with the pivots)
+    #
+    @staticmethod
+    def store_signals(data: DataFrame, par: RunParameters):
+        from algo import algo
+        import export
+
+        pivots = data['pivot'].to_numpy()
+        zones = Application.zones(data, par)
+        if zones is not None:
+            signals = zones.calc_signals(par.backcandles, par.gap_window, par.zone_height, par.breakout_factor, par.bounces)
+        else:
+            signals = algo.calc_signals(data['High'].to_numpy(), data['Low'].to_numpy(), data['Close'].to_numpy(), pivots,
+                                        par.backcandles, par.gap_window, par.zone_height, par.breakout_factor, par.bounces)
+        if par.trend_filter:
+            trends = algo.calc_trend_filter(data['Open'].to_numpy(), data['Close'].to_numpy(), par.ema_period, par.trend_backcandles)
+            signals = algo.filter_trend(signals, trends)
+
+        path = Application.export_path('signals')
+        export.store_signals(path, data.index, pivots, signals, meta=dict(ticker=Application.ticker, run=vars(par)))
+        print(f'signals: {path}')
+
+
     @staticmethod
-    def run(data: DataFrame, par: RunParameters, trading_par: TradingParameters, plot: bool = False):
+    def run(data: DataFrame, par: RunParameters, trading_par: TradingParameters, plot: bool = False, ledger = None):
+        from backtrader import Cerebro
+        from backtrader.sizers import PercentSizer
+        from backtrader.analyzers import SharpeRatio, DrawDown, Returns
+        from BreakoutStrategy import BreakoutStrategy
+        from feeds import ArrayData
 
         Application.logger.info(f'run: {Application.ticker}...\n')
-        pivots = data['pivot'].array._ndarray
-        pdata = PandasData(dataname=data, datetime=None, open=0, high=1, low=2, close=3, volume=4, openinterest=-1)
+        pdata = ArrayData(dataname=data)
+
+        if Application.STREAMING and par.zone_timeframe is not None:
+            Application.logger.warning(f'run: zone_timeframe {par.zone_timeframe} is ignored when streaming')
+        zones = Application.zones(data, par) if not Application.STREAMING else None
 
         Application.logger.debug(f'run: init cerebro...\n')
         cerebro = Cerebro(stdstats=True)
@@ -222,8 +414,16 @@ class Application :
                 gap_window   = par.gap_window,
                 zone_height  = par.zone_height,
                 breakout_f   = par.breakout_factor,
+                bounces      = par.bounces,
 
-                pivots       = pivots
+                pivot_window = Application.pivot_window,
+                streaming    = Application.STREAMING,
+                signal_cache = zones,
+                ledger       = ledger,
+
+                trend_filter      = par.trend_filter,
+                ema_period        = par.ema_period,
+                trend_backcandles = par.trend_backcandles
             )
 
         cerebro.addanalyzer(SharpeRatio, _name = "sharpe")
@@ -236,13 +436,14 @@ class Application :
         results = cerebro.run()
         end_value = cerebro.broker.get_value()
 
-        par_list = [
-                [   x.analyzers.returns.get_analysis()['rtot'],
-                    x.analyzers.returns.get_analysis()['rnorm100'],
-                    x.analyzers.drawdown.get_analysis()['max']['drawdown'],
-                    x.analyzers.sharpe.get_analysis()['sharperatio']
-                ] for x in results
-            ]
+        with profiler.stage('results'):
+            par_list = [
+                    [   x.analyzers.returns.get_analysis()['rtot'],
+                        x.analyzers.returns.get_analysis()['rnorm100'],
+                        x.analyzers.drawdown.get_analysis()['max']['drawdown'],
+                        x.analyzers.sharpe.get_analysis()['sharperatio']
+                    ] for x in results
+                ]
 
         print()
         par_df = DataFrame(par_list, columns = ['total', 'yearly', 'max-dd', 'sharpe',])
@@ -272,6 +473,12 @@ def get_args():
     p.add_argument("config", help="configuration file (json)")
 
     p.add_argument("-v", "--verbose", action="store_true", help="print stuff on the console")
+    p.add_argument("--offline", action="store_true", help="use the local price store only, don't download")
+    p.add_argument("--streaming", action="store_true", help="run: calculate the signals bar by bar")
+    p.add_argument("--trade-log", default=None, help="write the strategy events (orders, trades) to this JSONL file instead of the log")
+    p.add_argument("--profile", nargs='?', const='stages', choices=['stages', 'cprofile'], default=None,
+                   help="time the stages (load, pivots, signals, bars, ...), cprofile: also capture a cProfile; written to out/")
+    p.add_argument("--profile-startup", action="store_true", help="print the import cost per module of the configured code path and exit")
     p.add_argument("-log", "--loglevel",
                    choices=['debug', 'DEBUG', 'info', 'INFO', 'warning', 'WARNING', 'error', 'ERROR'],
                    help="loglevel (default=INFO)")
@@ -291,44 +498,63 @@ def get_loglevel(loglevel):
 #
 # MAIN FUNDTION
 #
-from plotting import pivot_plot
 import config
+import startup
 from config import Config, RuntimeOptions, RunOptions
 
 if __name__ == '__main__':
 
-    TEST = ['h', 'd', '5m', 'H', 'D', '5M']
-
     try:
         # read command line
         args = get_args()
 
         Application.VERBOSE = args.verbose
+        Application.OFFLINE = args.offline
+        Application.STREAMING = args.streaming
         Application.log_level = get_loglevel(args.loglevel)
         Application.initialize()
 
         Application.logger.info("START")
 
+        if args.profile_startup:
+            opt = RuntimeParameters(config.load_config(args.config).runtime)
+            startup.report(Application.startup_stages(Application.is_testdata(args.ticker), opt))
+            sys.exit(0)
+
+        if args.trade_log:
+            from BreakoutStrategy import BreakoutStrategy
+            BreakoutStrategy.EVENTS.open(args.trade_log)
+
+        # per stage timing (and a cProfile of everything below), see profiler.py
+        cprof = None
+        if args.profile:
+            profiler.enable()
+            if args.profile == 'cprofile':
+                import cProfile
+                cprof = cProfile.Profile()
+                cprof.enable()
+
         data = None
         ticker = None
 
         # loading data
         print("loading data...")
-        if args.ticker in TEST:
-            Application.ticker = 'EURUSD'
-            ticker = args.ticker.lower()
-            begin = int(args.begin)
-            end = int(args.end)
-            Application.logger.info(f'data = {ticker}, [start, end] = [{begin}, {end}]\n')
-            data = Application.load_testdata(ticker, begin, end)
-        else:
-            ticker = args.ticker.upper()
-            Application.ticker = ticker
-            # mandatory 'begin' and 'end' cmd line arguments
-            bdate = datetime.strptime(args.begin, '%Y%m%d').date()
-            edate = datetime.strptime(args.end, '%Y%m%d').date()
-            Application.logger.info(f'data = {ticker}, [start, end] = [{bdate}, {edate}]\n')
-            data = Application.fetch_data(ticker, bdate, edate)
+        with profiler.stage('load'):
+            if Application.is_testdata(args.ticker):
+                Application.ticker = 'EURUSD'
+                ticker = args.ticker if args.ticker not in Application.ALIASES else args.ticker.lower()
+                begin = int(args.begin)
+                end = int(args.end)
+                Application.logger.info(f'data = {ticker}, [start, end] = [{begin}, {end}]\n')
+                data = Application.load_testdata(ticker, begin, end)
+            else:
+                ticker = args.ticker.upper()
+                Application.ticker = ticker
+                # mandatory 'begin' and 'end' cmd line arguments
+                bdate = datetime.strptime(args.begin, '%Y%m%d').date()
+                edate = datetime.strptime(args.end, '%Y%m%d').date()
+                Application.logger.info(f'data = {ticker}, [start, end] = [{bdate}, {edate}]\n')
+                data = Application.fetch_data(ticker, bdate, edate)
 
 
         # load configuration file
@@ -340,7 +566,9 @@ if __name__ == '__main__':
 
         # we take the pivot_window parameter from run since we pre-calculate
         pvt = PivotParameters(configuration.pivot)
-        data['pivot'] = pivot(data=data, pivot_window=pvt.window)
+        Application.pivot_window = pvt.window
+        with profiler.stage('pivots'):
+            data['pivot'] = pivot(data=data, pivot_window=pvt.window)
 
         data.set_index("Date", inplace=True, drop=True)
         data.reset_index()
@@ -350,23 +578,48 @@ if __name__ == '__main__':
             data.to_csv(f"out/{ticker.lower()}-{args.begin}-{args.end}-backup.csv")
 
         if opt.PLOTTING:
+            from plotting import pivot_plot
             pivot_plot(data)
 
-        if opt.STORE_SIGNALS:
-            pass
+        # the signals are those of the run section, without one no run
+        # trades them
+        if opt.STORE_SIGNALS and configuration.run is None:
+            Application.logger.warning('store_signals: only stored with a run section')
+        elif opt.STORE_SIGNALS:
+            with profiler.stage('save'):
+                Application.store_signals(data, RunParameters(conf=configuration.run))
 
-        if opt.STORE_ACTIONS:
-            pass
+        if opt.STORE_ACTIONS and not opt.RUN:
+            Application.logger.warning('store_actions: only stored for run')
 
         if opt.RUN:
             run = RunParameters(conf=configuration.run)
             trading = TradingParameters(conf=configuration.trading)
-            Application.run(data=data, par=run, trading_par=trading, plot=opt.PLOTTING)
+            if opt.STORE_ACTIONS:
+                import export
+                path = Application.export_path('actions')
+                with export.Ledger(path, meta=dict(ticker=Application.ticker, run=vars(run))) as ledger, profiler.stage('run'):
+                    Application.run(data=data, par=run, trading_par=trading, plot=opt.PLOTTING, ledger=ledger)
+                print(f'actions: {path}')
+            else:
+                with profiler.stage('run'):
+                    Application.run(data=data, par=run, trading_par=trading, plot=opt.PLOTTING)
+
+        elif opt.WALKFORWARD:
+            optim = OptimizeParameters(conf=configuration.optim)
+            wf = WalkForwardParameters(conf=configuration.walkforward)
+            trading = TradingParameters(conf=configuration.trading)
+            with profiler.stage('walkforward'):
+                Application.walkforward(data=data, par=optim, wf_par=wf, trading_par=trading)
 
         elif opt.OPTIMIZE:
             optim = OptimizeParameters(conf=configuration.optim)
             trading = TradingParameters(conf=configuration.trading)
-            Application.optimize(data=data, par=optim, trading_par=trading)
+            with profiler.stage('optimize'):
+                Application.optimize(data=data, par=optim, trading_par=trading)
+
+        if args.profile:
+            Application.write_profile(cprof)
 
 
     except Exception as e:
@@ -32,15 +32,28 @@ class _Options:
 
 
 class Options(_Options):
+
+    # tags with a string value (e.g. a timeframe), all others are numbers or bools
+    strings = []
+
     def add(self, tag, value=None):
         value = self._check_value(tag, value)
 
-        if not type (value) in (int, float, bool):
-            raise ValueError(f"incorrect type in json object '{tag}'; got: {type (value)}, expected one of: 'int', 'float", 'bool')
+        if tag in self.strings:
+            if not type (value) == str:
+                raise ValueError(f"incorrect type in json object '{tag}'; got: {type (value)}, expected: 'str'")
+        elif not type (value) in (int, float, bool):
+            raise ValueError(f"incorrect type in json object '{tag}'; got: {type (value)}, expected one of: 'int', 'float', 'bool'")
 
         self.nodes[tag] = value
 
 
+    # tag that may be missing in the json object
+    def add_optional(self, tag):
+        if self.jsp is not None and tag in self.jsp:
+            self.add(tag)
+
+
 class PivotOptions(Options):
     tags = [
         'window'
@@ -51,6 +64,10 @@ class RuntimeOptions(Options):
         'save_snapshot','store_signals','store_actions','optimize','run','plotting'
     ]
 
+    optional = [
+        'walkforward'
+    ]
+
 
 
 class RunOptions(Options):
@@ -64,6 +81,27 @@ class RunOptions(Options):
         'breakout_factor'
     ]
 
+    optional = [
+        'trend_filter',
+        'ema_period',
+        'trend_backcandles',
+        'zone_timeframe',
+        'bounces'
+    ]
+
+    strings = [
+        'zone_timeframe'
+    ]
+
+class WalkForwardOptions(Options):
+    tags = [
+        'train', 'test'
+    ]
+
+    optional = [
+        'anchored', 'workers'
+    ]
+
 class TradingOptions(Options):
     tags = [
         'amount', 'commission', 'size', 'long', 'short'
@@ -71,6 +109,12 @@ class TradingOptions(Options):
 
 
 class OptimizeOptions(_Options):
+
+    # settings with a string value, all others are numbers or bools
+    strings = [
+        'engine', 'search'
+    ]
+
     @staticmethod
     def _is_range(fld):
         # detect if range (3 values, begin, end, step), otherwise its an array
@@ -113,14 +157,37 @@ class OptimizeOptions(_Options):
         self.nodes[tag] = OptimizeOptions._make_array_int(value)
 
 
+    # int parameter that may be missing in the json object, e.g. 'bounces'
+    def add_int_optional(self, tag):
+        if self.jsp is not None and tag in self.jsp:
+            self.add_int(tag)
+
+
+    # optional single valued setting (not a range), e.g. 'workers'
+    def add_setting(self, tag, value = None):
+        if value is None and (self.jsp is None or not tag in self.jsp):
+            return
+
+        value = self._check_value(tag, value)
+        if tag in OptimizeOptions.strings:
+            if not type (value) == str:
+                raise ValueError(f"incorrect type in json object '{tag}', within 'optimize'; got: {type (value)}, expected: 'str'")
+        elif not type (value) in (int, float, bool):
+            raise ValueError(f"incorrect type in json object '{tag}', within 'optimize'; got: {type (value)}, expected one of: 'int', 'float', 'bool'")
+
+        self.nodes[tag] = value
+
+
 
 class Config:
-    def __init__(self, runtime: RuntimeOptions, pivot: PivotOptions, run: RunOptions, optim: OptimizeOptions, trading: TradingOptions):
+    def __init__(self, runtime: RuntimeOptions, pivot: PivotOptions, run: RunOptions, optim: OptimizeOptions, trading: TradingOptions,
+                 walkforward: WalkForwardOptions = None):
         self.runtime = runtime
         self.pivot = pivot
         self.run = run
         self.optim = optim
         self.trading = trading
+        self.walkforward = walkforward
 
 
 
@@ -134,6 +201,7 @@ def load_config(configfile: str) -> Config:
     run: RunOptions = None
     trading: TradingOptions = None
     optim: OptimizeOptions = None
+    walkforward: WalkForwardOptions = None
 
     with open(configfile, "r") as fconf:
         c = json.load(fconf)
@@ -142,11 +210,15 @@ def load_config(configfile: str) -> Config:
             runtime = RuntimeOptions(c['runtimeoptions'])
             for tag in RuntimeOptions.tags:
                 runtime.add(tag)
+            for tag in RuntimeOptions.optional:
+                runtime.add_optional(tag)
 
         if 'run' in c:
             run = RunOptions(c['run'])
             for tag in RunOptions.tags:
                 run.add(tag)
+            for tag in RunOptions.optional:
+                run.add_optional(tag)
 
         if 'pivot' in c:
             pivot = PivotOptions(c['pivot'])
@@ -163,6 +235,30 @@ def load_config(configfile: str) -> Config:
             optim.add_float('tp_sl_ratio')
             optim.add_float('zone_height')
             optim.add_float('breakout_factor')
+            optim.add_int_optional('bounces')
+
+            optim.add_setting('workers')
+            optim.add_setting('engine')
+            optim.add_setting('crosscheck')
+            optim.add_setting('resume')
+            optim.add_setting('cache')
+            optim.add_setting('cache_size')
+
+            optim.add_setting('search')
+            optim.add_setting('budget')
+            optim.add_setting('seed')
+            optim.add_setting('eta')
+
+            optim.add_setting('trend_filter')
+            optim.add_setting('ema_period')
+            optim.add_setting('trend_backcandles')
+
+        if 'walkforward' in c:
+            walkforward = WalkForwardOptions(c['walkforward'])
+            for tag in WalkForwardOptions.tags:
+                walkforward.add(tag)
+            for tag in WalkForwardOptions.optional:
+                walkforward.add_optional(tag)
 
         if 'trading' in c:
             trading = TradingOptions(c['trading'])
@@ -170,5 +266,5 @@ def load_config(configfile: str) -> Config:
                 trading.add(tag)
 
     logger.debug("load_config: end\n")
-    return Config(runtime=runtime, pivot=pivot, run=run, optim=optim, trading=trading)
+    return Config(runtime=runtime, pivot=pivot, run=run, optim=optim, trading=trading, walkforward=walkforward)
 
@@ -0,0 +1,120 @@
+import hashlib
+import json
+import os
+import shutil
+import typing
+
+import numpy as np
+from pandas import DataFrame
+
+import logging
+logger = logging.getLogger()
+
+
+#
+# DataFrame stored as one .npy file per column plus meta.json
+#
+#   <path>/meta.json    the meta data passed to write_frame and the column names
+#   <path>/<nr>.npy     column data
+#
+# the directory is written next to path and then moved in place
+#
+def write_frame(path: str, data: DataFrame, meta: dict):
+    tmp = f'{path}.tmp{os.getpid()}'
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+
+    for i, name in enumerate(data.columns):
+        np.save(os.path.join(tmp, f'{i}.npy'), np.ascontiguousarray(data[name].to_numpy()))
+
+    with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+        json.dump(dict(meta, columns=list(data.columns)), f)
+
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp, path)
+
+
+#
+# returns the meta data and a DataFrame with memory mapped columns,
+# (None, None) if path doesn't hold a frame
+#
+def read_frame(path: str, mmap_mode: str = 'r') -> tuple[dict, DataFrame]:
+    try:
+        with open(os.path.join(path, 'meta.json'), 'r') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None, None
+
+    columns = dict()
+    for i, name in enumerate(meta['columns']):
+        columns[name] = np.load(os.path.join(path, f'{i}.npy'), mmap_mode=mmap_mode)
+
+    return meta, DataFrame(columns, copy=False)
+
+
+def is_columnar(data: DataFrame) -> bool:
+    return all(data[c].to_numpy().dtype.kind in 'biufM' for c in data.columns)
+
+
+
+#
+# on disk cache for parsed data files
+#
+# a parsed DataFrame is stored as one .npy file per column, the columns are
+# memory mapped when loaded. An entry is keyed by the absolute path of the
+# source file (and a variant, e.g. the parse options) and is valid as long as
+# the mtime and size of the source file don't change
+#
+#   cache/<key>/meta.json
+#   cache/<key>/<column nr>.npy
+#
+class DataCache:
+
+    DIR = 'cache'
+    VERSION = 1
+
+    def __init__(self, root: str = DIR):
+        self.root = root
+
+
+    @staticmethod
+    def _source_state(path: str) -> dict:
+        st = os.stat(path)
+        return dict(path=os.path.abspath(path), mtime=st.st_mtime_ns, size=st.st_size)
+
+
+    def _entry(self, path: str, variant: str) -> str:
+        key = hashlib.sha1(f'{os.path.abspath(path)}|{variant}'.encode()).hexdigest()
+        return os.path.join(self.root, key)
+
+
+    def _read(self, entry: str, source: dict) -> DataFrame:
+        meta, data = read_frame(entry)
+        if meta is None or meta.get('version') != DataCache.VERSION or meta.get('source') != source:
+            return None
+        return data
+
+
+    #
+    # returns the parsed data for path, parse() is only called if there is
+    # no valid cache entry
+    #
+    def load(self, path: str, parse: typing.Callable[[], DataFrame], variant: str = '') -> DataFrame:
+        source = DataCache._source_state(path)
+        entry = self._entry(path, variant)
+
+        data = self._read(entry, source)
+        if data is not None:
+            logger.debug(f'data cache: hit {path}')
+            return data
+
+        logger.debug(f'data cache: miss {path}')
+        data = parse()
+
+        if is_columnar(data):
+            try:
+                write_frame(entry, data, dict(version=DataCache.VERSION, source=source))
+            except OSError as e:
+                logger.warning(f'data cache: cannot store {path}: {e}')
+
+        return data
@@ -0,0 +1,90 @@
+import json
+import os
+
+from backtrader import num2date
+
+import logging
+logger = logging.getLogger()
+
+
+#
+# level gated event log of a strategy
+#
+# a strategy checks 'enabled' once (per run) and only then records events;
+# an event is a name and the raw values (no formatting), kept in a buffer
+# and written in batches of BATCH events and when the run stops:
+#
+#   to the logger   the message of the event (messages[name].format(**values)),
+#                   as BreakoutStrategy.log did
+#   to a trade log  one JSON object per line (see open):
+#                   {"run": 1, "ticker": "EURUSD", "bar": 17, "date": "2003-05-27", "event": "open_buy", "close": 1.17, ...}
+#
+# worker processes write to a trade log of their own (<path>.<pid>)
+#
+class EventLog:
+
+    BATCH = 1000
+
+    def __init__(self, messages: dict, level: int = logging.INFO, batch: int = BATCH):
+        self.messages = messages
+        self.level = level
+        self.batch = batch
+        self.buffer = []
+
+        self.path = None
+        self.owner = None       # process that opened the trade log
+        self.file = None
+        self.pid = None
+
+
+    # events are written to the JSONL trade log at path instead of the logger
+    def open(self, path: str):
+        self.close()
+        self.path = path
+        self.owner = os.getpid()
+
+
+    @property
+    def enabled(self) -> bool:
+        return logger.isEnabledFor(self.level)
+
+
+    # dt: backtrader date number of the bar
+    def emit(self, run: int, ticker: str, bar: int, dt: float, event: str, **values):
+        self.buffer.append((run, ticker, bar, dt, event, values))
+        if len(self.buffer) >= self.batch:
+            self.flush()
+
+
+    def _file(self):
+        if self.file is None or self.pid != os.getpid():
+            path = self.path if self.owner == os.getpid() else f'{self.path}.{os.getpid()}'
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self.file = open(path, 'a')
+            self.pid = os.getpid()
+        return self.file
+
+
+    def flush(self):
+        if not self.buffer:
+            return
+
+        if self.path is None:
+            for _, _, _, dt, event, values in self.buffer:
+                logger.log(self.level, '%s, %s' % (num2date(dt).date().isoformat(), self.messages[event].format(**values)))
+        else:
+            f = self._file()
+            f.writelines(json.dumps(dict(run=run, ticker=ticker, bar=bar, date=num2date(dt).isoformat(), event=event, **values), default=float) + '\n'
+                         for run, ticker, bar, dt, event, values in self.buffer)
+            f.flush()
+
+        self.buffer.clear()
+
+
+    def close(self):
+        self.flush()
+        if self.file is not None:
+            self.file.close()
+            self.file = None
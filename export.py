@@ -0,0 +1,145 @@
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+from datacache import read_frame, write_frame
+
+import logging
+logger = logging.getLogger()
+
+
+#
+# columnar export of signals and actions (orders, trades)
+#
+# a table is a directory of parts, every part is a frame of datacache.write_frame
+# (one .npy file per column plus meta.json):
+#
+#   <path>/0/meta.json, <path>/0/0.npy, ...
+#   <path>/1/...
+#
+# rows are buffered and written as a part when 'chunk' rows are buffered
+# and when the table is closed, so a long run streams its rows and a short
+# one writes them in bulk. read_table returns all parts as one DataFrame
+#
+class TableWriter:
+
+    CHUNK = 100_000
+
+    # columns: (name, numpy dtype) in the order of the rows
+    def __init__(self, path: str, columns: list[tuple[str, str]], meta: dict = None, chunk: int = CHUNK):
+        self.path = path
+        self.columns = columns
+        self.meta = meta or dict()
+        self.chunk = chunk
+        self.rows = []
+        self.parts = 0
+
+        shutil.rmtree(self.path, ignore_errors=True)
+        os.makedirs(self.path)
+
+
+    def append(self, row: tuple):
+        self.rows.append(row)
+        if len(self.rows) >= self.chunk:
+            self.flush()
+
+
+    # writes whole columns (name: array) as a part
+    def write(self, columns: dict):
+        data = DataFrame({name: np.asarray(columns[name], dtype=dtype) for name, dtype in self.columns}, copy=False)
+        write_frame(os.path.join(self.path, str(self.parts)), data, dict(self.meta, part=self.parts))
+        self.parts = self.parts + 1
+
+
+    def flush(self):
+        if not self.rows and self.parts > 0:
+            return
+
+        values = list(zip(*self.rows)) if self.rows else [[] for _ in self.columns]
+        self.write({name: x for (name, _), x in zip(self.columns, values)})
+        self.rows = []
+
+
+    def close(self):
+        self.flush()
+        logger.info(f'export: {self.path}, {self.parts} parts')
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *args):
+        self.close()
+
+
+
+def read_table(path: str) -> DataFrame:
+    parts = sorted((int(x) for x in os.listdir(path) if x.isdigit()))
+    frames = [read_frame(os.path.join(path, str(x)))[1] for x in parts]
+    return pd.concat(frames, ignore_index=True) if frames else DataFrame()
+
+
+
+#
+# signals: one row per bar
+#
+SIGNAL_COLUMNS = [('Date', 'datetime64[ns]'), ('pivot', 'int8'), ('signal', 'int8')]
+
+def store_signals(path: str, dates, pivots: np.ndarray, signals: np.ndarray, meta: dict = None):
+    with TableWriter(path, SIGNAL_COLUMNS, meta) as table:
+        table.write(dict(Date=np.asarray(dates, dtype='datetime64[ns]'), pivot=pivots, signal=signals))
+
+
+
+#
+# actions: the orders (every notification after Accepted) and the closed
+# trades of a run, filled by BreakoutStrategy (ledger param)
+#
+#   <path>/orders
+#   <path>/trades
+#
+# status is the index in backtrader Order.Status, meta.json holds the names
+#
+ORDER_COLUMNS = [('bar', 'int64'), ('Date', 'datetime64[ns]'), ('ref', 'int64'), ('buy', 'bool'), ('status', 'int8'),
+                 ('price', 'float64'), ('size', 'float64'), ('value', 'float64'), ('comm', 'float64')]
+
+TRADE_COLUMNS = [('ref', 'int64'), ('long', 'bool'), ('baropen', 'int64'), ('open', 'datetime64[ns]'), ('barclose', 'int64'), ('close', 'datetime64[ns]'),
+                 ('price', 'float64'), ('pnl', 'float64'), ('pnlcomm', 'float64'), ('commission', 'float64')]
+
+
+class Ledger:
+
+    def __init__(self, path: str, meta: dict = None, chunk: int = TableWriter.CHUNK):
+        from backtrader import Order
+
+        meta = dict(meta or dict(), status_names=list(Order.Status))
+        self.orders = TableWriter(os.path.join(path, 'orders'), ORDER_COLUMNS, meta, chunk)
+        self.trades = TableWriter(os.path.join(path, 'trades'), TRADE_COLUMNS, meta, chunk)
+
+
+    # date: datetime of the bar
+    def order(self, bar: int, date, order):
+        self.orders.append((bar, date, order.ref, order.isbuy(), order.status,
+                            order.executed.price, order.executed.size, order.executed.value, order.executed.comm))
+
+
+    def trade(self, trade, open, close):
+        self.trades.append((trade.ref, trade.long, trade.baropen, open, trade.barclose, close,
+                            trade.price, trade.pnl, trade.pnlcomm, trade.commission))
+
+
+    def close(self):
+        self.orders.close()
+        self.trades.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+from backtrader.feed import DataBase
+
+
+#
+# backtrader data feed on top of the NumPy columns of a DataFrame
+#
+# PandasData reads every value with DataFrame.iloc; ArrayData keeps one
+# contiguous array per line (float64 prices, int8 pivots) and only indexes
+# them. The arrays are views of the DataFrame columns, so any number of
+# Cerebro instances can share a frame, also one attached to shared memory
+# by a worker process (optimizer.SharedFrame)
+#
+# the datetime line is a column of backtrader date numbers (see feed_frame),
+# it is calculated once if the frame doesn't hold it yet. The pivots are a
+# line of their own (data.pivot), BreakoutStrategy takes them from there
+#
+DATETIME = 'datetime'
+
+COLUMNS = dict(datetime=DATETIME, open='Open', high='High', low='Low', close='Close', volume='Volume', pivot='pivot')
+
+
+#
+# backtrader date numbers (bt.date2num) of a DatetimeIndex, timezone aware
+# dates are converted to UTC
+#
+def date_numbers(index) -> np.ndarray:
+    index = pd.DatetimeIndex(index)
+    if index.tz is not None:
+        index = index.tz_convert(None)
+
+    ns = index.to_numpy().astype('datetime64[ns]').astype(np.int64)
+    days, rest = np.divmod(ns, 86_400_000_000_000)
+    return (days + 719_163).astype(np.float64) + rest / 86_400e9
+
+
+#
+# the data with the datetime column of the feed, calculate it once if the
+# data is used by many feeds (optimization) or shared with workers
+#
+def feed_frame(data: DataFrame) -> DataFrame:
+    if DATETIME in data.columns:
+        return data
+    return data.assign(**{DATETIME: date_numbers(data.index)})
+
+
+
+class ArrayData(DataBase):
+
+    lines = ('pivot',)
+
+    params = (
+        ('columns', COLUMNS),
+    )
+
+
+    def start(self):
+        super().start()
+
+        data = feed_frame(self.p.dataname)
+        names = [x for x in self.p.columns if self.p.columns[x] in data.columns]
+
+        self._lines = [getattr(self.lines, x) for x in names]
+        self._arrays = [data[self.p.columns[x]].to_numpy() for x in names]
+        self._size = len(data)
+        self._idx = -1
+
+
+    def _load(self):
+        self._idx += 1
+        if self._idx >= self._size:
+            return False
+
+        for line, values in zip(self._lines, self._arrays):
+            line[0] = values[self._idx]
+        return True
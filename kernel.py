@@ -0,0 +1,291 @@
+import math
+
+import numpy as np
+
+from trading import Signal
+from parameters import TradingParameters
+
+
+#
+# fast path backtest of the BreakoutStrategy
+#
+# reproduces what backtrader does for the strategy (one position at a time,
+# bracket orders, PercentSizer, percentage commission, BackBroker defaults)
+# directly on numpy arrays:
+#
+#   bar i     strategy is flat and has no pending order, signal -> bracket
+#             is submitted, size = cash / close[i] * percents / 100, the parent
+#             is a limit order at close[i] (bracket default)
+#   bar i+1   broker checks the cash of the bracket (parent, stop, limit
+#             pseudo executed in that order)
+#   bar f     the parent executes (at the open if it gaps through the limit)
+#             unless the cash goes negative, then the bracket is cancelled
+#   bar f+1.. stop and limit are active, stop is tested first
+#   bar j     exit, the strategy can submit a new bracket on the same bar
+#
+# BreakoutStrategy.next returns without moving its signal index as long as the
+# parent is pending, so the signal used at bar t is signals[t - lag] where lag
+# is the number of bars skipped so far
+#
+# note: as in BreakoutStrategy.next, a SELL signal is gated by 'long' and a BUY
+# signal by 'short'
+#
+
+RISKFREERATE = 0.01     # SharpeRatio default, yearly
+TANN = 252.0            # Returns analyzer, annualization for daily timeframe
+
+SEARCH_BLOCK = 256      # bars per block when searching for the exit of a position
+
+
+class KernelResult:
+
+    def __init__(self, values: np.ndarray, trades: int, rtot: float, rnorm100: float, maxdd: float, sharpe: float):
+        self.values   = values      # portfolio value at the end of every bar
+        self.trades   = trades
+        self.rtot     = rtot
+        self.rnorm100 = rnorm100
+        self.maxdd    = maxdd
+        self.sharpe   = sharpe
+
+
+
+#
+# the cash check of BackBroker.check_submitted for a bracket order
+#
+def _accept_bracket(cash: float, size: float, price: float, stop: float, limit: float, comm: float) -> bool:
+    # parent opens the position
+    value = size * price
+    cash -= value
+    cash -= abs(size) * comm * price
+    if cash < 0.0:
+        return False
+
+    # stop closes it
+    cash += size * stop + 0
+    cash -= abs(size) * comm * stop
+    if cash < 0.0:
+        return False
+
+    # limit (pseudo executed on the closed position) opens the opposite side
+    cash -= -size * limit
+    cash -= abs(size) * comm * limit
+    return cash >= 0.0
+
+
+
+#
+# portfolio value while holding 'size' entered at 'entry'
+#
+def _position_values(cash: float, size: float, entry: float, close: np.ndarray) -> np.ndarray:
+    dvalue = size * close
+    if size > 0:
+        dunrealized = size * (close - entry) * 1.0
+        return cash + ((dvalue - dunrealized) / 1.0 + dunrealized)
+
+    return cash + dvalue
+
+
+
+#
+# first bar >= begin where an order executes, -1 if none
+#
+#   is_buy:   buy (True) or sell order
+#   stop:     stop price or None
+#   limit:    limit price or None
+#
+def _find_exec(is_buy: bool, stop: float, limit: float, open: np.ndarray, high: np.ndarray, low: np.ndarray, begin: int) -> int:
+    sz = len(open)
+    block = SEARCH_BLOCK
+    while begin < sz:
+        end = min(sz, begin + block)
+        o, h, l = open[begin:end], high[begin:end], low[begin:end]
+
+        hit = np.zeros(end - begin, dtype=bool)
+        if is_buy:
+            if stop is not None:
+                hit |= (o >= stop) | (h >= stop)
+            if limit is not None:
+                hit |= (limit >= o) | (limit >= l)
+        else:
+            if stop is not None:
+                hit |= (o <= stop) | (l <= stop)
+            if limit is not None:
+                hit |= (limit <= o) | (limit <= h)
+
+        idx = np.flatnonzero(hit)
+        if len(idx) > 0:
+            return begin + int(idx[0])
+
+        begin = end
+        block = block * 2
+
+    return -1
+
+
+#
+# execution price of a limit order (BackBroker._try_exec_limit)
+#
+def _limit_price(is_buy: bool, limit: float, popen: float) -> float:
+    if is_buy:
+        return popen if limit >= popen else limit
+    return popen if limit <= popen else limit
+
+
+#
+# execution price of the bracket children, stop is tested first
+#
+def _exit_price(is_buy: bool, stop: float, limit: float, popen: float, phigh: float, plow: float) -> float:
+    if is_buy:
+        if popen >= stop:
+            return popen
+        if phigh >= stop:
+            return stop
+        return _limit_price(is_buy, limit, popen)
+
+    if popen <= stop:
+        return popen
+    if plow <= stop:
+        return stop
+    return _limit_price(is_buy, limit, popen)
+
+
+
+#
+# metrics as calculated by the Returns, DrawDown and SharpeRatio analyzers
+#
+def metrics(values: np.ndarray, dates: np.ndarray, start_value: float) -> tuple[float, float, float, float]:
+    end_value = float(values[-1])
+
+    # Returns (timeframe days)
+    days = dates.astype('datetime64[D]')
+    tcount = 1 + int(np.count_nonzero(days[1:] > days[:-1]))
+
+    nlrtot = end_value / start_value
+    rtot = math.log(nlrtot) if nlrtot >= 0.0 else float('-inf')
+    ravg = rtot / tcount
+    rnorm = math.expm1(ravg * TANN) if ravg > float('-inf') else ravg
+
+    # DrawDown
+    maxvalue = np.maximum.accumulate(values)
+    maxdd = max(0.0, float(np.max(100.0 * (maxvalue - values) / maxvalue)))
+
+    # SharpeRatio (yearly returns)
+    years = dates.astype('datetime64[Y]')
+    last = np.append(np.flatnonzero(years[1:] > years[:-1]), len(values) - 1)
+    ends = values[last].tolist()
+    starts = [start_value] + ends[:-1]
+    returns = [(e / s) - 1.0 for s, e in zip(starts, ends)]
+
+    rate = pow(1.0 + RISKFREERATE, 1.0 / 1) - 1.0
+    ret_free = [r - rate for r in returns]
+    ret_free_avg = math.fsum(ret_free) / len(ret_free)
+    retdev = math.sqrt(math.fsum([pow(r - ret_free_avg, 2.0) for r in ret_free]) / len(ret_free))
+    try:
+        sharpe = ret_free_avg / retdev
+    except ZeroDivisionError:
+        sharpe = None
+
+    return rtot, rnorm * 100.0, maxdd, sharpe
+
+
+
+#
+# runs the strategy on the price data
+#
+# open, high, low, close    numpy arrays with the price data
+# signals                   signal per bar (see algo.calc_signals)
+# dates                     datetime64 per bar (used for the metrics)
+#
+def backtest(open: np.ndarray, high: np.ndarray, low: np.ndarray, close: np.ndarray, signals: np.ndarray, dates: np.ndarray,
+             tp_sl_ratio: float, sl_distance: float, trading_par: TradingParameters) -> KernelResult:
+
+    open  = np.asarray(open, dtype=np.float64)
+    high  = np.asarray(high, dtype=np.float64)
+    low   = np.asarray(low, dtype=np.float64)
+    close = np.asarray(close, dtype=np.float64)
+    signals = np.asarray(signals)
+
+    sz = len(close)
+    comm = trading_par.commission
+    percents = 100 * trading_par.size       # as passed to the PercentSizer
+
+    accepted = np.zeros(sz, dtype=bool)
+    if trading_par.plong:
+        accepted |= signals == Signal.SELL
+    if trading_par.pshort:
+        accepted |= signals == Signal.BUY
+    entries = np.flatnonzero(accepted)
+
+    cash = trading_par.amount
+    values = np.empty(sz, dtype=np.float64)
+    filled = 0      # values are known up to here
+    trades = 0
+
+    t = 0           # first bar where the strategy is flat without pending order
+    lag = 0         # bars skipped by the strategy while an order was pending
+    while True:
+        k = np.searchsorted(entries, t - lag)
+        if k == len(entries) or entries[k] + lag + 1 >= sz:
+            break
+
+        i = int(entries[k]) + lag
+        values[filled:i+1] = cash + 0.0
+        filled = i + 1
+
+        price = float(close[i])
+        is_long = signals[i - lag] == Signal.BUY
+
+        size = cash / price * (percents / 100)
+        if is_long:
+            stop  = price * (1.0 - sl_distance)
+            limit = price * (1.0 + tp_sl_ratio * sl_distance)
+        else:
+            size  = -size
+            stop  = price * (1.0 + sl_distance)
+            limit = price * (1.0 - tp_sl_ratio * sl_distance)
+
+        if not _accept_bracket(cash, size, price, stop, limit, comm):
+            t = i + 1
+            continue
+
+        # parent, limit order at the close of the signal bar
+        f = _find_exec(is_long, None, price, open, high, low, i + 1)
+        if f < 0:
+            break
+
+        lag += f - i - 1
+        entry = _limit_price(is_long, price, float(open[f]))
+        ecash = cash - size * entry
+        ecash -= abs(size) * comm * entry
+        if ecash < 0.0:
+            values[filled:f] = cash + 0.0
+            filled = f
+            t = f
+            continue
+
+        values[filled:f] = cash + 0.0
+        cash = ecash
+        trades = trades + 1
+
+        # children, active from the bar after the parent executed
+        j = _find_exec(not is_long, stop, limit, open, high, low, f + 1)
+        if j < 0:
+            values[f:] = _position_values(cash, size, entry, close[f:])
+            filled = sz
+            break
+
+        values[f:j] = _position_values(cash, size, entry, close[f:j])
+        filled = j
+
+        # exit, close the position
+        price = _exit_price(not is_long, stop, limit, float(open[j]), float(high[j]), float(low[j]))
+        pnl = size * (price - entry) * 1.0
+        cash += size * entry + pnl * True
+        cash -= abs(size) * comm * price
+
+        t = j
+
+    values[filled:] = cash + 0.0
+
+    rtot, rnorm100, maxdd, sharpe = metrics(values, dates, trading_par.amount)
+    return KernelResult(values, trades, rtot, rnorm100, maxdd, sharpe)
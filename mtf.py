@@ -0,0 +1,112 @@
+import numpy as np
+import pandas as pd
+from pandas import DataFrame
+
+from algo import algo
+from pivot import Pivot, PivotIndex, pivots
+from trading import Signal
+import resample
+
+import logging
+logger = logging.getLogger()
+
+
+#
+# multi timeframe signals: zones of a higher timeframe, breakouts of the bars
+#
+# the zones are made of the pivots of the higher timeframe bars (e.g. hourly
+# bars of 5 minute data, see resample.py), a breakout is a close of a bar of
+# the data beyond the zone. The higher timeframe bars, their pivots and the
+# index 'closed' are calculated once:
+#
+#   closed[i]   number of higher timeframe bars that are complete when bar i
+#               of the data closes
+#
+# a higher timeframe bar is complete when its end (start + timeframe) is at
+# or before the close of bar i (date + the bar period of the data), so bar i
+# only sees finished bars. backcandles and gap_window count higher timeframe
+# bars; the window of bar i is [closed[i] - backcandles - gap_window,
+# closed[i] - gap_window), gap_window >= pivot_window keeps the pivots in it
+# confirmed (as in algo.calc_signal)
+#
+# same interface as SignalCache (the arrays passed to signals_for are ignored),
+# so it is passed to BreakoutStrategy as signal_cache
+#
+class MultiTimeframe:
+
+    def __init__(self, data: DataFrame, timeframe: str, pivot_window: int = Pivot.WINDOW):
+        seconds = resample.seconds(timeframe)
+        if seconds is None:
+            raise ValueError(f'invalid timeframe: {timeframe}')
+
+        dates = pd.DatetimeIndex(data.index)
+        if dates.tz is not None:
+            dates = dates.tz_convert(None)
+        ns = dates.to_numpy().astype('datetime64[ns]').astype(np.int64)
+
+        source = DataFrame(dict(Date=dates.to_numpy(), **{c: data[c].to_numpy() for c in ['Open', 'High', 'Low', 'Close', 'Volume']}))
+        bars = resample.resample(source, seconds)
+        if len(bars) == 0:
+            logger.warning(f'multi timeframe: no {timeframe} bars')
+
+        self.timeframe = timeframe
+        low  = bars['Low'].to_numpy(dtype=np.float64)
+        high = bars['High'].to_numpy(dtype=np.float64)
+        self.pivots = PivotIndex(pivots(low, high, pivot_window), low, high)
+        self.close  = data['Close'].to_numpy(dtype=np.float64)
+
+        # bar period of the data: the smallest step between bars
+        period = np.diff(ns).min() if len(ns) > 1 else 0
+        end = bars['Date'].to_numpy().astype('datetime64[ns]').astype(np.int64) + seconds * resample.NS
+        self.closed = np.searchsorted(end, ns + period, side='right')
+
+        self.signals = dict()
+        self.hits = 0
+        self.misses = 0
+
+
+    def key(self, backcandles: int, gap_window: int, zone_height: float, breakout_f: float, bounces: int = algo.BOUNCES) -> tuple:
+        return (self.timeframe, backcandles, gap_window, zone_height, breakout_f, bounces)
+
+
+    #
+    # the signals of all bars in one pass, see algo.calc_signals
+    #
+    def calc_signals(self, backcandles: int, gap_window: int, zone_height: float, breakout_f: float, bounces: int = algo.BOUNCES) -> np.ndarray:
+        signals = np.full(len(self.close), Signal.NONE, dtype=np.int64)
+
+        begin = self.closed - backcandles - gap_window
+        end   = self.closed - gap_window
+        idx = np.flatnonzero(begin >= 0)
+        if len(idx) == 0:
+            return signals
+
+        begin, end, cclose = begin[idx], end[idx], self.close[idx]
+
+        mean = algo._calc_zones(self.pivots, Pivot.LOW, begin, end, zone_height, bounces)
+        sell = (mean - cclose) > zone_height * mean * breakout_f
+
+        mean = algo._calc_zones(self.pivots, Pivot.HIGH, begin, end, zone_height, bounces)
+        buy = (cclose - mean) > zone_height * mean * breakout_f
+
+        signals[idx] = np.where(sell, Signal.SELL, np.where(buy, Signal.BUY, Signal.NONE))
+        return signals
+
+
+    def signals_for(self, high, low, close, pivots, backcandles: int, gap_window: int, zone_height: float, breakout_f: float, bounces: int = algo.BOUNCES):
+        key = self.key(backcandles, gap_window, zone_height, breakout_f, bounces)
+
+        signals = self.signals.get(key)
+        if signals is not None:
+            self.hits = self.hits + 1
+            return signals
+
+        self.misses = self.misses + 1
+        logger.debug(f'multi timeframe: calculating {key}')
+        signals = self.calc_signals(backcandles, gap_window, zone_height, breakout_f, bounces)
+        self.signals[key] = signals
+        return signals
+
+
+    def get(self, data, backcandles: int, gap_window: int, pivots: list[int], zone_height: float, breakout_f: float, bounces: int = algo.BOUNCES):
+        return self.signals_for(None, None, None, None, backcandles, gap_window, zone_height, breakout_f, bounces)
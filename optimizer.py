@@ -0,0 +1,381 @@
+import gc
+import itertools
+import math
+import multiprocessing
+import os
+import random
+import typing
+from multiprocessing import shared_memory
+
+import numpy as np
+from pandas import DataFrame, Index
+
+from backtrader import Cerebro
+from backtrader.sizers import PercentSizer
+from backtrader.analyzers import SharpeRatio, DrawDown, Returns
+
+from BreakoutStrategy import BreakoutStrategy
+from feeds import ArrayData, feed_frame
+from algo import algo
+from signalcache import SignalCache
+from parameters import OptimizeParameters, TradingParameters
+import kernel
+import profiler
+import resultcache
+
+import logging
+logger = logging.getLogger()
+
+
+#
+# columns of the optimization results, one record per parameter combination
+#
+RESULT_COLUMNS = ['tp-sl', 'stoploss-d', 'back', 'gap', 'zone-height', 'bof', 'bounces', 'total', 'yearly', 'max-dd', 'sharpe']
+
+
+#
+# DataFrame columns (and index) stored in a single shared memory block
+#
+# the block is created once by the main process, workers attach to it
+# by name so the price data and pivots are not pickled for every run
+#
+class SharedFrame:
+
+    ALIGN = 8
+
+    def __init__(self, data: DataFrame):
+        arrays = [('__index__', data.index.to_numpy())] + [(name, data[name].to_numpy()) for name in data.columns]
+
+        self.layout = []
+        offset = 0
+        for name, values in arrays:
+            self.layout.append((name, values.dtype.str, offset))
+            offset += -(-values.nbytes // SharedFrame.ALIGN) * SharedFrame.ALIGN
+
+        self.size = len(data)
+        self.index_name = data.index.name
+        self.shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+
+        for (name, dtype, offset), (_, values) in zip(self.layout, arrays):
+            np.ndarray(self.size, dtype=dtype, buffer=self.shm.buf, offset=offset)[:] = values
+
+
+    # picklable description, passed to the workers
+    def describe(self) -> dict:
+        return dict(name=self.shm.name, size=self.size, index_name=self.index_name, layout=self.layout)
+
+
+    def close(self):
+        self.shm.close()
+        self.shm.unlink()
+
+
+    #
+    # attach to a shared block, returns the block (keep a reference as long as
+    # the frame is used) and a DataFrame on top of the shared memory
+    #
+    @staticmethod
+    def attach(desc: dict) -> tuple[shared_memory.SharedMemory, DataFrame]:
+        shm = shared_memory.SharedMemory(name=desc['name'])
+
+        columns = dict()
+        for name, dtype, offset in desc['layout']:
+            columns[name] = np.ndarray(desc['size'], dtype=dtype, buffer=shm.buf, offset=offset)
+
+        index = Index(columns.pop('__index__'), name=desc['index_name'], copy=False)
+        return shm, DataFrame(columns, index=index, copy=False)
+
+
+
+#
+# strategy params of a combination, the first columns of a record
+#
+PARAM_KEYS = ['tp_sl_ratio', 'sl_distance', 'backcandles', 'gap_window', 'zone_height', 'breakout_f', 'bounces']
+
+
+#
+# strategy params that are the same for all combinations
+#
+def settings(par: OptimizeParameters) -> dict:
+    return dict(trend_filter=par.trend_filter, ema_period=par.ema_period, trend_backcandles=par.trend_backcandles)
+
+
+#
+# the parameter combinations (strategy params), same order as cerebro.optstrategy
+#
+def combinations(par: OptimizeParameters) -> list[dict]:
+    values = [par.tp_sl_ratio, par.sl_distance, par.backcandles, par.gap_window, par.zone_height, par.breakout_factor, par.bounces]
+    return [dict(zip(PARAM_KEYS, x), **settings(par)) for x in itertools.product(*values)]
+
+
+def params(combination: dict) -> list:
+    return [combination[k] for k in PARAM_KEYS]
+
+
+#
+# description of the inputs of an optimization (besides the combinations),
+# results are only comparable if it is the same. The code version (as in
+# the ResultCache run key) keeps the rows of a changed backtest out of a
+# resumed results file
+#
+def run_description(data: DataFrame, par: OptimizeParameters, trading_par: TradingParameters) -> dict:
+    return dict(data=SignalCache.data_fingerprint(data), settings=settings(par), trading=vars(trading_par), code=resultcache.code_version())
+
+
+#
+# params and analyzer outputs of a finished strategy
+#
+def strategy_record(strategy) -> list:
+    return [
+        strategy.params.tp_sl_ratio,
+        strategy.params.sl_distance,
+        strategy.params.backcandles,
+        strategy.params.gap_window,
+        strategy.params.zone_height,
+        strategy.params.breakout_f,
+        strategy.params.bounces,
+
+        strategy.analyzers.returns.get_analysis()['rtot'],
+        strategy.analyzers.returns.get_analysis()['rnorm100'],
+        strategy.analyzers.drawdown.get_analysis()['max']['drawdown'],
+        strategy.analyzers.sharpe.get_analysis()['sharperatio']
+    ]
+
+
+#
+# backtest a single parameter combination, returns the strategy
+#
+# stdstats: add the standard observers (broker value, trades, buy/sell), not
+# needed for the analyzer metrics
+#
+def run_strategy(data: DataFrame, trading_par: TradingParameters, ticker: str, signal_cache: SignalCache, combination: dict, stdstats: bool = True) -> BreakoutStrategy:
+    pdata = ArrayData(dataname=data)
+
+    cerebro = Cerebro(stdstats=stdstats)
+    cerebro.broker.setcash(trading_par.amount)
+    cerebro.broker.setcommission(trading_par.commission)
+    cerebro.addsizer(PercentSizer, percents = 100 * trading_par.size)
+    cerebro.adddata(data=pdata)
+
+    cerebro.addstrategy(
+        BreakoutStrategy,
+            ticker       = ticker,
+            signal_cache = signal_cache,
+            **combination
+        )
+
+    cerebro.addanalyzer(SharpeRatio, _name = "sharpe")
+    cerebro.addanalyzer(DrawDown, _name = "drawdown")
+    cerebro.addanalyzer(Returns, _name = "returns")
+
+    results = cerebro.run()
+    return results[0]
+
+
+#
+# backtest a single parameter combination, returns the record (RESULT_COLUMNS)
+#
+# only the record is kept, the strategy with its line buffers and analyzers
+# is released at once. Cerebro, the strategy and the lines reference each
+# other, so they are freed by a collection instead of piling up in the old
+# generation over a long optimization; a run takes far longer than the
+# collection
+#
+def run_combination(data: DataFrame, trading_par: TradingParameters, ticker: str, signal_cache: SignalCache, combination: dict) -> list:
+    strategy = run_strategy(data, trading_par, ticker, signal_cache, combination, stdstats=False)
+    with profiler.stage('results'):
+        record = strategy_record(strategy)
+
+    del strategy
+    gc.collect()
+    return record
+
+
+
+#
+# worker process state, set by _init_worker
+#
+_worker = dict()
+
+def _init_worker(desc: dict, trading_par: TradingParameters, ticker: str, long: bool, short: bool, verbose: bool):
+    shm, data = SharedFrame.attach(desc)
+
+    BreakoutStrategy.LONG = long
+    BreakoutStrategy.SHORT = short
+    BreakoutStrategy.VERBOSE = verbose
+
+    _worker['shm'] = shm
+    _worker['data'] = data
+    _worker['trading'] = trading_par
+    _worker['ticker'] = ticker
+    _worker['signal_cache'] = SignalCache.from_data(data)
+
+
+def _run_worker(combination: dict) -> list:
+    return run_combination(_worker['data'], _worker['trading'], _worker['ticker'], _worker['signal_cache'], combination)
+
+
+def cpu_count(workers: int) -> int:
+    return workers if workers > 0 else (os.cpu_count() or 1)
+
+
+#
+# the optimization engines below yield one record per combination (see
+# RESULT_COLUMNS) as soon as it is finished, in the order of todo
+#
+
+#
+# runs the parameter combinations one after the other
+#
+def optimize_serial(data: DataFrame, todo: list[dict], trading_par: TradingParameters, ticker: str) -> typing.Iterator[list]:
+    logger.info(f'optimize: {len(todo)} runs\n')
+
+    # signals are shared by all runs with the same signal parameters, the
+    # feed columns by all Cerebro instances
+    signal_cache = SignalCache.from_data(data)
+    data = feed_frame(data)
+    for combination in todo:
+        yield run_combination(data, trading_par, ticker, signal_cache, combination)
+
+    logger.info(f'optimize: signal configurations calculated: {signal_cache.misses}, reused: {signal_cache.hits}\n')
+
+
+#
+# runs the parameter combinations over a pool of worker processes
+#
+def optimize_parallel(data: DataFrame, todo: list[dict], workers: int, trading_par: TradingParameters, ticker: str) -> typing.Iterator[list]:
+    workers = max(1, min(workers, len(todo)))
+
+    logger.info(f'optimize: {len(todo)} runs on {workers} workers\n')
+
+    shared = SharedFrame(feed_frame(data))
+    try:
+        initargs = (shared.describe(), trading_par, ticker, BreakoutStrategy.LONG, BreakoutStrategy.SHORT, BreakoutStrategy.VERBOSE)
+        with multiprocessing.Pool(processes=workers, initializer=_init_worker, initargs=initargs) as pool:
+            chunksize = max(1, len(todo) // (4 * workers))
+            yield from pool.imap(_run_worker, todo, chunksize=chunksize)
+    finally:
+        shared.close()
+
+
+
+#
+# runs the combinations with the engine ('backtrader' or 'kernel'), on a
+# pool of workers if workers > 1 (backtrader)
+#
+def evaluate(engine: str, workers: int, data: DataFrame, todo: list[dict], trading_par: TradingParameters, ticker: str) -> typing.Iterator[list]:
+    if not todo:
+        return iter(())
+    if engine == 'kernel':
+        return optimize_kernel(data, todo, trading_par)
+    if workers > 1:
+        return optimize_parallel(data, todo, workers, trading_par, ticker)
+    return optimize_serial(data, todo, trading_par, ticker)
+
+
+
+#
+# backtest a single parameter combination with the fast path kernel
+#
+def kernel_backtest(data: DataFrame, trading_par: TradingParameters, signal_cache: SignalCache, combination: dict) -> kernel.KernelResult:
+    signals = signal_cache.signals_for(
+                    high        = data['High'].to_numpy(),
+                    low         = data['Low'].to_numpy(),
+                    close       = data['Close'].to_numpy(),
+                    pivots      = data['pivot'].to_numpy(),
+                    backcandles = combination['backcandles'],
+                    gap_window  = combination['gap_window'],
+                    zone_height = combination['zone_height'],
+                    breakout_f  = combination['breakout_f'],
+                    bounces     = combination['bounces']
+                    )
+
+    if combination.get('trend_filter'):
+        trends = algo.calc_trend_filter(
+                    open        = data['Open'].to_numpy(),
+                    close       = data['Close'].to_numpy(),
+                    ema_period  = combination['ema_period'],
+                    backcandles = combination['trend_backcandles']
+                    )
+        signals = algo.filter_trend(signals, trends)
+
+    result = kernel.backtest(
+                    open        = data['Open'].to_numpy(),
+                    high        = data['High'].to_numpy(),
+                    low         = data['Low'].to_numpy(),
+                    close       = data['Close'].to_numpy(),
+                    signals     = signals,
+                    dates       = data.index.to_numpy(),
+                    tp_sl_ratio = combination['tp_sl_ratio'],
+                    sl_distance = combination['sl_distance'],
+                    trading_par = trading_par
+                    )
+
+    return result
+
+
+def run_kernel(data: DataFrame, trading_par: TradingParameters, signal_cache: SignalCache, combination: dict) -> list:
+    result = kernel_backtest(data, trading_par, signal_cache, combination)
+    return params(combination) + [
+        result.rtot,
+        result.rnorm100,
+        result.maxdd,
+        result.sharpe
+    ]
+
+
+def optimize_kernel(data: DataFrame, todo: list[dict], trading_par: TradingParameters) -> typing.Iterator[list]:
+    logger.info(f'optimize: {len(todo)} runs with the kernel\n')
+
+    signal_cache = SignalCache.from_data(data)
+    for combination in todo:
+        yield run_kernel(data, trading_par, signal_cache, combination)
+
+
+#
+# backtest a single parameter combination with the engine, returns the
+# record and the portfolio value at the end of every bar
+#
+def backtest(engine: str, data: DataFrame, trading_par: TradingParameters, ticker: str, signal_cache: SignalCache, combination: dict) -> tuple[list, np.ndarray]:
+    if engine == 'kernel':
+        result = kernel_backtest(data, trading_par, signal_cache, combination)
+        return params(combination) + [result.rtot, result.rnorm100, result.maxdd, result.sharpe], result.values
+
+    strategy = run_strategy(data, trading_par, ticker, signal_cache, combination)
+    record = strategy_record(strategy)
+    values = np.array(strategy.stats.broker.lines.value.array[:len(data)])
+
+    del strategy
+    gc.collect()
+    return record, values
+
+
+
+#
+# compares the metrics of a sample of kernel results with backtrader,
+# records[i] is the kernel result of todo[i]
+#
+# returns the number of combinations that don't match
+#
+def crosscheck(data: DataFrame, trading_par: TradingParameters, ticker: str, todo: list[dict], records: list[list], samples: int, seed: int = 0) -> int:
+
+    def _same(x, y):
+        if x is None or y is None:
+            return x is None and y is None
+        return math.isclose(x, y, rel_tol=1e-9, abs_tol=1e-12)
+
+    n = len(PARAM_KEYS)
+    selected = sorted(random.Random(seed).sample(range(len(records)), min(samples, len(records))))
+
+    signal_cache = SignalCache.from_data(data)
+    data = feed_frame(data)
+    mismatches = 0
+    for idx in selected:
+        combination = todo[idx]
+        expected = run_combination(data, trading_par, ticker, signal_cache, combination)
+        if not all(_same(x, y) for x, y in zip(records[idx][n:], expected[n:])):
+            mismatches = mismatches + 1
+            logger.warning(f'crosscheck: {combination}, kernel: {records[idx][n:]}, backtrader: {expected[n:]}')
+
+    logger.info(f'crosscheck: {len(selected)} combinations, {mismatches} mismatches\n')
+    return mismatches
@@ -30,6 +30,16 @@ class RunParameters:
         self.tp_sl_ratio = 1.9
         self.zone_height = 0.001
         self.breakout_factor = 1.84
+        self.bounces = 3                # pivots that form a zone (algo.BOUNCES)
+
+        # trend filter, only signals in the direction of the ema trend
+        self.trend_filter = False
+        self.ema_period = 50
+        self.trend_backcandles = 10
+
+        # zones of a higher timeframe (e.g. "h", "4h"; see mtf.py), None: the
+        # timeframe of the data
+        self.zone_timeframe = None
 
 
         if conf is None:
@@ -61,6 +71,28 @@ class RunParameters:
         if conf.has(tag):
             self.breakout_factor = conf.get(tag)
 
+        tag = "bounces"
+        if conf.has(tag):
+            self.bounces = conf.get(tag)
+            if self.bounces < 1:
+                raise ValueError(f"incorrect value in json object '{tag}'; got: {self.bounces}, expected: >= 1")
+
+        tag = "trend_filter"
+        if conf.has(tag):
+            self.trend_filter = conf.get(tag)
+
+        tag = "ema_period"
+        if conf.has(tag):
+            self.ema_period = conf.get(tag)
+
+        tag = "trend_backcandles"
+        if conf.has(tag):
+            self.trend_backcandles = conf.get(tag)
+
+        tag = "zone_timeframe"
+        if conf.has(tag):
+            self.zone_timeframe = conf.get(tag)
+
 
 
 # parameters for optimization run
@@ -75,6 +107,35 @@ class OptimizeParameters:
         self.tp_sl_ratio     = [1.5 + x/10 for x in range(0, 5)]
         self.zone_height     = [0.00090, 0.00095, 0.00100]
         self.breakout_factor = [1.84 + x/25 for x in range(0, 5)]
+        self.bounces         = [3]
+
+        # number of worker processes (1: serial run, 0: all cores)
+        self.workers         = 1
+
+        # 'backtrader' or 'kernel' (fast path, see kernel.py)
+        self.engine          = 'backtrader'
+
+        # number of kernel results to verify with backtrader
+        self.crosscheck      = 0
+
+        # skip the runs that are already in the results file
+        self.resume          = True
+
+        # reuse the runs of earlier optimizations (see resultcache.py), the
+        # cache is limited to cache_size MB
+        self.cache           = True
+        self.cache_size      = 256
+
+        # search strategy, see search.py ('grid', 'random', 'halving', 'tpe')
+        self.search          = 'grid'
+        self.budget          = 50       # number of runs (not for grid)
+        self.seed            = 0
+        self.eta             = 3        # halving: fraction of runs that continue (1/eta)
+
+        # trend filter (same for all runs)
+        self.trend_filter      = False
+        self.ema_period        = 50
+        self.trend_backcandles = 10
 
 
         if conf is None:
@@ -105,6 +166,97 @@ class OptimizeParameters:
         if conf.has(tag):
             self.breakout_factor = conf.get(tag)
 
+        tag = 'bounces'
+        if conf.has(tag):
+            self.bounces = conf.get(tag)
+            if any(x < 1 for x in self.bounces):
+                raise ValueError(f"incorrect value in json object '{tag}', within 'optimize'; got: {self.bounces}, expected: values >= 1")
+
+        tag = 'workers'
+        if conf.has(tag):
+            self.workers = conf.get(tag)
+
+        tag = 'engine'
+        if conf.has(tag):
+            self.engine = conf.get(tag)
+
+        tag = 'crosscheck'
+        if conf.has(tag):
+            self.crosscheck = conf.get(tag)
+
+        tag = 'resume'
+        if conf.has(tag):
+            self.resume = conf.get(tag)
+
+        tag = 'cache'
+        if conf.has(tag):
+            self.cache = conf.get(tag)
+
+        tag = 'cache_size'
+        if conf.has(tag):
+            self.cache_size = conf.get(tag)
+
+        tag = 'search'
+        if conf.has(tag):
+            self.search = conf.get(tag)
+
+        tag = 'budget'
+        if conf.has(tag):
+            self.budget = conf.get(tag)
+
+        tag = 'seed'
+        if conf.has(tag):
+            self.seed = conf.get(tag)
+
+        tag = 'eta'
+        if conf.has(tag):
+            self.eta = conf.get(tag)
+
+        tag = 'trend_filter'
+        if conf.has(tag):
+            self.trend_filter = conf.get(tag)
+
+        tag = 'ema_period'
+        if conf.has(tag):
+            self.ema_period = conf.get(tag)
+
+        tag = 'trend_backcandles'
+        if conf.has(tag):
+            self.trend_backcandles = conf.get(tag)
+
+
+
+# parameters for walk forward optimization (the search is the one of optimize)
+class WalkForwardParameters:
+
+    # conf: the JSON object, default if None
+    def __init__(self, conf: config.WalkForwardOptions):
+        # defaults
+        self.train = 1000           # bars per train window
+        self.test = 250             # bars per test window (step between folds)
+        self.anchored = False       # train windows start at the first bar
+        self.workers = 1            # folds run concurrently (1: serial, 0: all cores)
+
+        if conf is None:
+            return
+
+        # copy provided parameters
+        tag = "train"
+        if conf.has(tag):
+            self.train = conf.get(tag)
+
+        tag = "test"
+        if conf.has(tag):
+            self.test = conf.get(tag)
+
+        tag = "anchored"
+        if conf.has(tag):
+            self.anchored = conf.get(tag)
+
+        tag = "workers"
+        if conf.has(tag):
+            self.workers = conf.get(tag)
+
 
 
 # parameters for trading
@@ -156,6 +308,7 @@ class RuntimeParameters:
         self.OPTIMIZE: bool = False
         self.RUN: bool = False
         self.PLOTTING: bool = False
+        self.WALKFORWARD: bool = False
 
         if conf is None:
             return
@@ -166,7 +319,7 @@ class RuntimeParameters:
 
         tag = "store_signals"
         if conf.has(tag):
-            self.STORE_ACTIONS = conf.get(tag)
+            self.STORE_SIGNALS = conf.get(tag)
 
         tag = "store_actions"
         if conf.has(tag):
@@ -184,4 +337,8 @@ class RuntimeParameters:
         if conf.has(tag):
             self.PLOTTING = conf.get(tag)
 
+        tag = "walkforward"
+        if conf.has(tag):
+            self.WALKFORWARD = conf.get(tag)
+
 
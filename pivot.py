@@ -1,3 +1,5 @@
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 from pandas import DataFrame, Series
 
 #
@@ -52,7 +54,145 @@ def pivot_candle(data: DataFrame, candle_idx: int, pivot_window: int) -> int:
 
 
 
+#
+#   vectorized version of pivot_candle over the whole series
+#
+#   a candle is a pivot low if no low in the centered window of width
+#   2*pivot_window+1 is strictly lower (same for pivot high), i.e. the
+#   candle low equals the rolling window min
+#   NaN never compares as lower/higher, so NaN is mapped to +inf/-inf
+#   for the rolling min/max which gives the same result as pivot_candle
+#
+#   args:
+#       low, high:    arrays of equal length
+#       pivot_window: before and after candle to test if pivot
+#
+#   returns:
+#       int8 array with the same codes as pivot_candle,
+#       Pivot.NONE for the first and last pivot_window candles
+#
+def pivots(low: np.ndarray, high: np.ndarray, pivot_window: int) -> np.ndarray:
+    low  = np.asarray(low, dtype=np.float64)
+    high = np.asarray(high, dtype=np.float64)
+
+    sz = len(low)
+    result = np.full(sz, Pivot.NONE, dtype=np.int8)
+
+    width = 2 * pivot_window + 1
+    if sz < width:
+        return result
+
+    wmin = sliding_window_view(np.where(np.isnan(low), np.inf, low), width).min(axis=1)
+    wmax = sliding_window_view(np.where(np.isnan(high), -np.inf, high), width).max(axis=1)
+
+    center = slice(pivot_window, sz - pivot_window)
+    pivot_low  = np.where(wmin < low[center],  Pivot.NONE, Pivot.LOW)
+    pivot_high = np.where(wmax > high[center], Pivot.NONE, Pivot.HIGH)
+
+    result[center] = pivot_high | pivot_low
+    return result
+
+
+
 def pivot(data: DataFrame, pivot_window: int) -> Series:
-    return data.apply(lambda x: pivot_candle(data, x.name, pivot_window), axis=1)   
+    return Series(pivots(data['Low'].to_numpy(), data['High'].to_numpy(), pivot_window), index=data.index)   
  
 
+
+
+
+#
+#   sparse index of the pivots: the sorted positions of the pivot lows and
+#   pivot highs and their prices (low of a pivot low, high of a pivot high)
+#
+#   pivots are a few percent of the candles, so the pivots of a window
+#   [begin, end) are found with two binary searches instead of a scan over
+#   the dense pivot array. A candle that is both a low and a high pivot is
+#   neither (as in SignalEngine)
+#
+#   zones: a zone is formed by n consecutive pivots whose prices don't
+#   deviate more than zone_height * mean from their mean. The sums of all
+#   sets of n consecutive pivots are added up column by column over the
+#   window (left to right, as SignalEngine does, so the error of a set
+#   doesn't depend on the history before it) and the deviation is taken from
+#   the window min and max (max |price - mean| = max(max - mean, mean - min)),
+#   for all sets at once. They are calculated once per (n, zone_height) and
+#   shared by all windows
+#
+class PivotIndex:
+
+    def __init__(self, pivots: np.ndarray, low: np.ndarray, high: np.ndarray):
+        pivots = np.asarray(pivots)[:len(low)]
+
+        self.low_pos   = np.flatnonzero(pivots == Pivot.LOW)
+        self.low       = np.asarray(low, dtype=np.float64)[self.low_pos]
+        self.high_pos  = np.flatnonzero(pivots == Pivot.HIGH)
+        self.high      = np.asarray(high, dtype=np.float64)[self.high_pos]
+
+        self._zones = dict()
+
+
+    # the index of pivots, pivots if it is one already
+    @staticmethod
+    def of(pivots, low, high) -> 'PivotIndex':
+        return pivots if isinstance(pivots, PivotIndex) else PivotIndex(pivots, low, high)
+
+
+    # positions and prices of the pivot lows (Pivot.LOW) or highs (Pivot.HIGH)
+    def get(self, highlow: int) -> tuple[np.ndarray, np.ndarray]:
+        return (self.low_pos, self.low) if highlow == Pivot.LOW else (self.high_pos, self.high)
+
+
+    #
+    #   prices of the last n pivots (highlow) in [begin, end), oldest first,
+    #   fewer if the window holds less than n
+    #
+    def last(self, highlow: int, begin: int, end: int, n: int) -> np.ndarray:
+        pos, values = self.get(highlow)
+        k = np.searchsorted(pos, end)
+        j = max(np.searchsorted(pos, begin), k - n)
+        return values[j:k]
+
+
+    #
+    #   zone means of the pivots (highlow): means[k] is the mean of the pivots
+    #   k-n .. k-1 if they form a zone, else NaN (len: number of pivots + 1)
+    #
+    def zones(self, highlow: int, n: int, zone_height: float) -> np.ndarray:
+        if n < 1:
+            raise ValueError(f'bounces must be >= 1, got: {n}')
+
+        key = (highlow, n, zone_height)
+        means = self._zones.get(key)
+        if means is not None:
+            return means
+
+        _, values = self.get(highlow)
+
+        means = np.full(len(values) + 1, np.nan)
+        if n <= len(values):
+            window = sliding_window_view(values, n)
+            total = window[:, 0].copy()
+            for j in range(1, n):
+                total += window[:, j]
+            mean = total / n
+            deviation = np.maximum(window.max(axis=1) - mean, mean - window.min(axis=1))
+            means[n:] = np.where(deviation > zone_height * mean, np.nan, mean)
+
+        self._zones[key] = means
+        return means
+
+
+    #
+    #   zone mean of the last n pivots (highlow) in [begin, end), None if the
+    #   window holds less than n pivots or they don't form a zone
+    #
+    def zone(self, highlow: int, begin: int, end: int, n: int, zone_height: float) -> float:
+        pos, _ = self.get(highlow)
+        k = np.searchsorted(pos, end)
+        means = self.zones(highlow, n, zone_height)
+        if k < n or pos[k-n] < begin:
+            return None
+
+        mean = means[k]
+        return None if np.isnan(mean) else float(mean)
@@ -0,0 +1,211 @@
+import importlib.util
+import os
+from datetime import date
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame, MultiIndex
+
+from datacache import read_frame, write_frame
+
+import logging
+logger = logging.getLogger()
+
+
+#
+# source of daily price data
+#
+# download returns the bars in [start, end) as a DataFrame with a 'Date'
+# column and (at least) the PriceStore.COLUMNS, it may be empty
+#
+class PriceProvider:
+
+    def download(self, ticker: str, start: date, end: date) -> DataFrame:
+        raise NotImplementedError
+
+
+
+class YahooProvider(PriceProvider):
+
+    def download(self, ticker: str, start: date, end: date) -> DataFrame:
+        import yfinance as yf
+
+        data = yf.download(ticker, start=start, end=end)
+        if isinstance(data.columns, MultiIndex):
+            data.columns = data.columns.get_level_values(0)
+        data.columns.name = None
+        return data.reset_index(drop=False)
+
+
+#
+# the yfinance provider if yfinance is installed, else None (offline); the
+# module is only looked up, it is imported by the first download
+#
+def default_provider() -> PriceProvider:
+    if importlib.util.find_spec('yfinance') is None:
+        return None
+    return YahooProvider()
+
+
+
+#
+# local store of daily price data
+#
+# every ticker has its own directory with one .npy file per column (see
+# datacache.write_frame), meta.json holds the date ranges that were
+# downloaded so far:
+#
+#   prices/<TICKER>/meta.json       {"version": 1, "ranges": [["2020-01-01", "2021-01-01"], ...]}
+#   prices/<TICKER>/<nr>.npy
+#
+# ranges are [start, end), a covered range without bars (weekend, holiday)
+# isn't downloaded again. Requests are served from disk, only the gaps are
+# downloaded. Without a provider (or when the download fails) the store
+# works offline and returns what it has
+#
+class PriceStore:
+
+    DIR = 'prices'
+    VERSION = 1
+    COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+    def __init__(self, root: str = DIR, provider: PriceProvider = None):
+        self.root = root
+        self.provider = provider
+
+
+    def _path(self, ticker: str) -> str:
+        return os.path.join(self.root, ticker.upper())
+
+
+    @staticmethod
+    def _empty() -> DataFrame:
+        columns = dict(Date=np.array([], dtype='datetime64[ns]'))
+        columns.update({c: np.array([], dtype=np.float64) for c in PriceStore.COLUMNS})
+        return DataFrame(columns)
+
+
+    #
+    # covered ranges and the stored bars of a ticker
+    #
+    def _load(self, ticker: str) -> tuple[list, DataFrame]:
+        meta, data = read_frame(self._path(ticker))
+        if meta is None or meta.get('version') != PriceStore.VERSION:
+            return [], PriceStore._empty()
+
+        ranges = [(date.fromisoformat(b), date.fromisoformat(e)) for b, e in meta['ranges']]
+        return ranges, data
+
+
+    def _save(self, ticker: str, ranges: list, data: DataFrame):
+        os.makedirs(self.root, exist_ok=True)
+        meta = dict(version=PriceStore.VERSION, ranges=[[b.isoformat(), e.isoformat()] for b, e in ranges])
+        write_frame(self._path(ticker), data, meta)
+
+
+    #
+    # Date column (tz naive, datetime64[ns]) and the store columns of downloaded data
+    #
+    @staticmethod
+    def _normalize(data: DataFrame) -> DataFrame:
+        if not 'Date' in data.columns:
+            data = data.rename({data.columns[0]: 'Date'}, axis=1)
+
+        missing = [c for c in PriceStore.COLUMNS if not c in data.columns]
+        if missing:
+            raise ValueError(f'price data without columns: {missing}')
+
+        dates = pd.to_datetime(data['Date'])
+        if dates.dt.tz is not None:
+            dates = dates.dt.tz_localize(None)
+
+        result = DataFrame({'Date': dates.to_numpy(dtype='datetime64[ns]')})
+        for c in PriceStore.COLUMNS:
+            result[c] = data[c].to_numpy(dtype=np.float64)
+        return result
+
+
+    @staticmethod
+    def merge_ranges(ranges: list) -> list:
+        merged = []
+        for b, e in sorted(ranges):
+            if merged and b <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], e))
+            else:
+                merged.append((b, e))
+        return merged
+
+
+    #
+    # the parts of [start, end) not covered by ranges
+    #
+    @staticmethod
+    def missing(ranges: list, start: date, end: date) -> list:
+        gaps = []
+        for b, e in PriceStore.merge_ranges(ranges):
+            if e <= start:
+                continue
+            if b >= end:
+                break
+            if b > start:
+                gaps.append((start, b))
+            start = max(start, e)
+
+        if start < end:
+            gaps.append((start, end))
+        return gaps
+
+
+    #
+    # downloads the gaps, returns the ranges that are covered now
+    # and the merged bars
+    #
+    def _update(self, ticker: str, gaps: list, ranges: list, data: DataFrame) -> tuple[list, DataFrame]:
+        today = date.today()
+        frames = [data]
+        for b, e in gaps:
+            if b >= today:
+                continue
+            try:
+                new = PriceStore._normalize(self.provider.download(ticker, b, e))
+            except Exception as ex:
+                logger.warning(f'price store: download {ticker} [{b}, {e}) failed: {ex}')
+                continue
+
+            logger.info(f'price store: downloaded {ticker} [{b}, {e}), {len(new)} bars')
+            frames.append(new)
+
+            # the bar of today may still change
+            ranges = ranges + [(b, min(e, today))]
+
+        if len(frames) == 1:
+            return ranges, data
+
+        data = pd.concat(frames, ignore_index=True)
+        data = data.drop_duplicates(subset='Date', keep='last').sort_values('Date').reset_index(drop=True)
+        return PriceStore.merge_ranges(ranges), data
+
+
+    #
+    # daily bars of ticker in [start, end), columns 'Date' and COLUMNS
+    #
+    def get(self, ticker: str, start, end) -> DataFrame:
+        start = pd.Timestamp(start).date()
+        end = pd.Timestamp(end).date()
+
+        ranges, data = self._load(ticker)
+        gaps = PriceStore.missing(ranges, start, end)
+
+        if gaps and self.provider is None:
+            logger.warning(f'price store: offline, {ticker} not available for {gaps}')
+        elif gaps:
+            covered, data = self._update(ticker, gaps, ranges, data)
+            if covered != ranges:
+                try:
+                    self._save(ticker, covered, data)
+                except OSError as e:
+                    logger.warning(f'price store: cannot store {ticker}: {e}')
+
+        dates = data['Date'].to_numpy()
+        selected = (dates >= np.datetime64(start, 'ns')) & (dates < np.datetime64(end, 'ns'))
+        return data[selected].reset_index(drop=True)
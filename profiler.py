@@ -0,0 +1,110 @@
+import json
+import os
+import time
+
+import logging
+logger = logging.getLogger()
+
+
+#
+# per stage timing of the hot paths
+#
+#   with profiler.stage('pivots'):
+#       ...
+#
+# records the wall time and the number of calls per stage. When profiling
+# is off (the default) stage() returns a shared object that does nothing,
+# so a hook costs a global lookup and a call. Stages can be nested (e.g.
+# 'signals' runs within 'optimize'), the times are not exclusive
+#
+# the stages of breakout.py:
+#
+#   load        loading (or fetching) the data
+#   pivots      pivot detection
+#   signals     signal generation in BreakoutStrategy.__init__
+#   bars        the bar loop of a strategy run (start to stop: next, broker,
+#               analyzers and observers)
+#   next        BreakoutStrategy.next
+#   results     reading the analyzer results after a run (the analyzers
+#               themselves run in 'bars')
+#   save        writing results (results file, exports)
+#   run, optimize, walkforward
+#
+# only the main process is timed; the runs of worker processes (workers > 1)
+# show up in the total of the calling stage
+#
+ENABLED = False
+
+_stages = dict()        # name: [calls, seconds]
+
+
+class _Stage:
+
+    __slots__ = ('name', 't')
+
+    def __init__(self, name: str):
+        self.name = name
+
+
+    def __enter__(self):
+        self.t = time.perf_counter()
+        return self
+
+
+    def __exit__(self, *args):
+        add(self.name, time.perf_counter() - self.t)
+
+
+
+class _NoStage:
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+_NO_STAGE = _NoStage()
+
+
+def stage(name: str):
+    return _Stage(name) if ENABLED else _NO_STAGE
+
+
+def add(name: str, seconds: float, calls: int = 1):
+    s = _stages.get(name)
+    if s is None:
+        s = _stages[name] = [0, 0.0]
+    s[0] += calls
+    s[1] += seconds
+
+
+def enable():
+    global ENABLED
+    ENABLED = True
+    _stages.clear()
+
+
+
+#
+# the stages as {name: {calls, seconds, mean_ms}}, in the order they were
+# first entered
+#
+def report() -> dict:
+    return {name: dict(calls=calls, seconds=seconds, mean_ms=1000.0 * seconds / calls if calls else 0.0)
+                for name, (calls, seconds) in _stages.items()}
+
+
+def write(path: str, meta: dict = None):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    with open(path, 'w') as f:
+        json.dump(dict(meta=meta or dict(), stages=report()), f, indent=2)
+
+    print(f"\n{'stage':<14} {'calls':>8} {'seconds':>10} {'mean [ms]':>10}")
+    for name, s in report().items():
+        print(f"{name:<14} {s['calls']:>8d} {s['seconds']:>10.3f} {s['mean_ms']:>10.3f}")
+    print(f'profile: {path}')
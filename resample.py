@@ -0,0 +1,67 @@
+import re
+
+import numpy as np
+from pandas import DataFrame
+
+
+#
+# higher timeframe OHLCV bars from the bars of a finer source
+#
+# a timeframe is <n><unit>, unit m (minutes), h (hours), d (days) or w
+# (weeks, starting on monday), n defaults to 1: 15m, 4h, d, 2d, w. Names
+# are lower case only, so they don't shadow symbols (W, 2D). A bar
+# holds the source bars of [start, start + timeframe), start is a multiple
+# of the timeframe since 1970-01-01 (a monday for weeks) and is the Date of
+# the bar:
+#
+#   Open    first Open          High    max High        Volume  sum Volume
+#   Close   last Close          Low     min Low
+#
+# empty source bars (Volume 0) are dropped first and timeframes without
+# source bars have no bar. The source must be sorted by Date; the bars are
+# built in one pass with ufunc.reduceat over the runs of equal buckets
+#
+UNITS = dict(m=60, h=3600, d=86400, w=7 * 86400)      # seconds
+
+NS = 1_000_000_000
+MONDAY = 4 * 86400          # 1970-01-01 is a thursday, 1970-01-05 a monday
+
+
+
+# timeframe in seconds, None if name isn't a timeframe
+def seconds(name: str) -> int:
+    m = re.fullmatch(r'(\d*)([mhdw])', name)
+    if m is None:
+        return None
+    n = int(m.group(1)) if m.group(1) else 1
+    return n * UNITS[m.group(2)] if n > 0 else None
+
+
+# the bars with Volume 0 removed (no trades in the bar)
+def drop_empty(data: DataFrame) -> DataFrame:
+    return data[data['Volume'] != 0]
+
+
+def resample(data: DataFrame, timeframe: int) -> DataFrame:
+    data = drop_empty(data)
+
+    ns = data['Date'].to_numpy().astype('datetime64[ns]').astype(np.int64)
+    offset = MONDAY * NS if timeframe % UNITS['w'] == 0 else 0
+    bucket = (ns - offset) // (timeframe * NS)
+
+    if len(bucket) == 0:
+        return DataFrame(dict(Date=np.array([], dtype='datetime64[ns]'), Open=[], High=[], Low=[], Close=[], Volume=[]))
+    if np.any(np.diff(bucket) < 0):
+        raise ValueError('resample: the source is not sorted by Date')
+
+    starts = np.flatnonzero(np.concatenate(([True], bucket[1:] != bucket[:-1])))
+    ends = np.concatenate((starts[1:], [len(bucket)])) - 1
+
+    return DataFrame(dict(
+                Date   = (bucket[starts] * (timeframe * NS) + offset).astype('datetime64[ns]'),
+                Open   = data['Open'].to_numpy()[starts],
+                High   = np.maximum.reduceat(data['High'].to_numpy(), starts),
+                Low    = np.minimum.reduceat(data['Low'].to_numpy(), starts),
+                Close  = data['Close'].to_numpy()[ends],
+                Volume = np.add.reduceat(data['Volume'].to_numpy(), starts)
+                ))
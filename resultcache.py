@@ -0,0 +1,239 @@
+import hashlib
+import json
+import os
+import time
+
+import logging
+logger = logging.getLogger()
+
+
+#
+# persistent store of optimization results, shared by all optimizations
+#
+# a record (see optimizer.RESULT_COLUMNS) is stored under the run key and
+# the strategy params of its combination. The run key is a hash of
+#
+#   the run description     data fingerprint (prices and pivots), the
+#                           settings of all runs and the trading parameters
+#   the pivot window
+#   the engine
+#   the code version        hash of the modules that calculate a result
+#
+# so a sweep that overlaps an earlier one (e.g. a wider backcandles range)
+# only runs the new combinations. Every run key has its own file, one JSON
+# record per line, appended and flushed as soon as a run is finished:
+#
+#   cache/results/<run key>.jsonl     {"version": 1, "run": {...}}
+#                                     [<params>, <metrics>]
+#                                     ...
+#
+# a file is touched when it is used; if the store grows beyond max_size the
+# least recently used files are removed (evict). Inspect or purge it with
+#
+#   python resultcache.py list
+#   python resultcache.py purge [--all] [--max-size MB] [--older-than DAYS]
+#
+DIR = os.path.join('cache', 'results')        # next to the DataCache entries
+VERSION = 2
+MAX_SIZE = 256          # MB
+
+CODE_FILES = ['BreakoutStrategy.py', 'algo.py', 'feeds.py', 'kernel.py', 'optimizer.py', 'pivot.py', 'signalcache.py', 'trading.py']
+
+
+#
+# hash of the source of the modules that calculate the results
+#
+def code_version() -> str:
+    h = hashlib.sha1()
+    base = os.path.dirname(os.path.abspath(__file__))
+    for name in CODE_FILES:
+        h.update(name.encode())
+        with open(os.path.join(base, name), 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+
+
+class ResultCache:
+
+    def __init__(self, run: dict, nkeys: int, root: str = DIR, max_size: int = MAX_SIZE):
+        self.root = root
+        self.nkeys = nkeys                      # the first nkeys values identify a combination
+        self.max_size = max_size * 2**20
+        self.run = dict(run, code=code_version())
+        self.records = dict()
+        self.hits = 0
+
+        key = hashlib.sha1(json.dumps(self.run, sort_keys=True, default=str).encode()).hexdigest()
+        self.path = os.path.join(self.root, f'{key}.jsonl')
+
+        if not self._load():
+            self._create()
+
+        self.file = open(self.path, 'a')
+
+
+    @staticmethod
+    def _key(values) -> tuple:
+        return tuple(float(x) for x in values)
+
+
+    #
+    # reads the records of the run key, False if there is no (valid) file
+    #
+    def _load(self) -> bool:
+        try:
+            with open(self.path, 'rb') as f:
+                content = f.read()
+        except OSError:
+            return False
+
+        # drop a partly written last line
+        complete = content[:content.rfind(b'\n') + 1]
+        lines = complete.decode().splitlines()
+        try:
+            meta = json.loads(lines[0]) if lines else None
+        except ValueError:
+            meta = None
+        if meta is None or meta.get('version') != VERSION:
+            return False
+
+        if len(complete) < len(content):
+            with open(self.path, 'r+b') as f:
+                f.truncate(len(complete))
+
+        for line in lines[1:]:
+            record = json.loads(line)
+            self.records[ResultCache._key(record[:self.nkeys])] = record
+
+        os.utime(self.path)
+        logger.info(f'result cache: {self.path}, {len(self.records)} records')
+        return True
+
+
+    def _create(self):
+        os.makedirs(self.root, exist_ok=True)
+        with open(self.path, 'w') as f:
+            f.write(json.dumps(dict(version=VERSION, run=self.run), default=str) + '\n')
+
+
+    def __len__(self):
+        return len(self.records)
+
+
+    # the cached record of a combination (first nkeys values), None if not found
+    def get(self, values) -> list:
+        record = self.records.get(ResultCache._key(values))
+        if record is not None:
+            self.hits = self.hits + 1
+        return record
+
+
+    def put(self, record: list):
+        self.file.write(json.dumps(record, default=float) + '\n')
+        self.file.flush()
+        self.records[ResultCache._key(record[:self.nkeys])] = record
+
+
+    def close(self):
+        self.file.close()
+        evict(self.root, self.max_size, keep=[self.path])
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *args):
+        self.close()
+
+
+
+#
+# the files of the store as (path, size, last use, run), most recently used first
+#
+def entries(root: str = DIR) -> list[tuple[str, int, float, dict]]:
+    if not os.path.isdir(root):
+        return []
+
+    result = []
+    for name in os.listdir(root):
+        if not name.endswith('.jsonl'):
+            continue
+        path = os.path.join(root, name)
+        try:
+            st = os.stat(path)
+            with open(path, 'r') as f:
+                run = json.loads(f.readline()).get('run')
+        except (OSError, ValueError):
+            run = None
+        result.append((path, st.st_size, st.st_mtime, run))
+
+    return sorted(result, key=lambda x: -x[2])
+
+
+#
+# removes the least recently used files until the store is at most
+# max_size bytes, the files in keep are never removed
+#
+def evict(root: str = DIR, max_size: int = MAX_SIZE * 2**20, keep: list[str] = ()) -> list[str]:
+    removed = []
+    total = sum(x[1] for x in entries(root))
+    for path, size, _, _ in reversed(entries(root)):
+        if total <= max_size:
+            break
+        if path in keep:
+            continue
+        os.remove(path)
+        removed.append(path)
+        total = total - size
+
+    if removed:
+        logger.info(f'result cache: evicted {len(removed)} files')
+    return removed
+
+
+def purge(root: str = DIR, older_than: float = None) -> list[str]:
+    removed = []
+    for path, _, mtime, _ in entries(root):
+        if older_than is None or time.time() - mtime > older_than * 86400:
+            os.remove(path)
+            removed.append(path)
+    return removed
+
+
+
+def get_args():
+    import argparse
+    p = argparse.ArgumentParser(description="inspect or purge the optimization result cache")
+    p.add_argument("command", choices=['list', 'purge'])
+    p.add_argument("--dir", default=DIR, help=f"cache directory (default: {DIR})")
+    p.add_argument("--all", action="store_true", help="purge: remove every file")
+    p.add_argument("--older-than", type=float, default=None, help="purge: remove the files not used for DAYS days")
+    p.add_argument("--max-size", type=float, default=None, help="purge: remove the least recently used files down to MB")
+    return p.parse_args()
+
+
+if __name__ == '__main__':
+    args = get_args()
+
+    if args.command == 'list':
+        files = entries(args.dir)
+        for path, size, mtime, run in files:
+            with open(path, 'rb') as f:
+                records = f.read().count(b'\n') - 1
+            data = run['data'][:12] if run and 'data' in run else '?'
+            engine = run.get('engine', '?') if run else '?'
+            print(f"{os.path.basename(path)[:12]}  {time.strftime('%Y-%m-%d %H:%M', time.localtime(mtime))}  {size / 2**20:8.2f} MB  {records:8d} records  data: {data}  engine: {engine}")
+        print(f"{len(files)} files, {sum(x[1] for x in files) / 2**20:.2f} MB in {args.dir}")
+
+    else:
+        if args.all:
+            removed = purge(args.dir)
+        elif args.older_than is not None:
+            removed = purge(args.dir, older_than=args.older_than)
+        elif args.max_size is not None:
+            removed = evict(args.dir, int(args.max_size * 2**20))
+        else:
+            raise SystemExit('purge: one of --all, --older-than or --max-size is required')
+        print(f'removed {len(removed)} files')
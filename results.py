@@ -0,0 +1,126 @@
+import csv
+import json
+import os
+
+import logging
+logger = logging.getLogger()
+
+
+#
+# append only CSV file with one row per parameter combination
+#
+# every row is flushed as soon as it is written, so an interrupted
+# optimization keeps the finished combinations. A rerun with the same run
+# description (data, trading parameters, code version) continues the file
+# and skips the combinations that are already present; a partly written
+# last row is dropped. Otherwise the file is started again.
+#
+#   <path>              ,<columns>        (leading row number, as DataFrame.to_csv)
+#   <path>.meta.json    {"run": <run description>}
+#
+class ResultWriter:
+
+    def __init__(self, path: str, columns: list[str], nkeys: int, run: dict, resume: bool = True):
+        self.path = path
+        self.columns = columns
+        self.nkeys = nkeys          # the first nkeys columns identify a combination
+        self.run = run
+        self.records = dict()       # key: record of the rows in the file
+        self.rows = 0
+
+        if not (resume and self._load()):
+            self._create()
+
+        self.file = open(self.path, 'a', newline='')
+        self.writer = csv.writer(self.file)
+
+
+    @staticmethod
+    def _key(values) -> tuple:
+        return tuple(float(x) for x in values)
+
+
+    @staticmethod
+    def _parse(row: list[str]) -> list:
+        return [None if x == '' else float(x) for x in row]
+
+
+    def _meta_path(self) -> str:
+        return f'{self.path}.meta.json'
+
+
+    #
+    # reads the rows of a previous run, False if the file can't be continued
+    #
+    def _load(self) -> bool:
+        try:
+            with open(self._meta_path(), 'r') as f:
+                meta = json.load(f)
+            with open(self.path, 'rb') as f:
+                content = f.read()
+        except (OSError, ValueError):
+            return False
+
+        if meta.get('run') != self.run:
+            logger.info(f'results: {self.path} is from another run, starting again')
+            return False
+
+        # drop a partly written last row
+        complete = content[:content.rfind(b'\n') + 1]
+        if len(complete) < len(content):
+            with open(self.path, 'r+b') as f:
+                f.truncate(len(complete))
+
+        lines = complete.decode().splitlines()
+        if not lines or next(csv.reader(lines[:1]))[1:] != self.columns:
+            return False
+
+        for row in csv.reader(lines[1:]):
+            record = ResultWriter._parse(row[1:])
+            self.records[ResultWriter._key(record[:self.nkeys])] = record
+            self.rows = self.rows + 1
+
+        logger.info(f'results: continuing {self.path}, {self.rows} rows')
+        return True
+
+
+    def _create(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with open(self._meta_path(), 'w') as f:
+            json.dump(dict(run=self.run), f)
+
+        with open(self.path, 'w', newline='') as f:
+            csv.writer(f).writerow([''] + self.columns)
+
+
+    # True if the combination (first nkeys values) is in the file
+    def has(self, values) -> bool:
+        return ResultWriter._key(values) in self.records
+
+
+    # the record of a combination in the file (values as float), None if not found
+    def get(self, values) -> list:
+        return self.records.get(ResultWriter._key(values))
+
+
+    def write(self, record: list):
+        self.writer.writerow([self.rows] + ['' if x is None else x for x in record])
+        self.file.flush()
+
+        self.records[ResultWriter._key(record[:self.nkeys])] = record
+        self.rows = self.rows + 1
+
+
+    def close(self):
+        self.file.close()
+
+
+    def __enter__(self):
+        return self
+
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,218 @@
+import math
+import random
+import typing
+
+from parameters import OptimizeParameters
+import optimizer
+
+import logging
+logger = logging.getLogger()
+
+
+#
+# search strategies for the optimization
+#
+#   grid        every combination (default)
+#   random      'budget' combinations drawn from the grid
+#   halving     successive halving: a sample of combinations is run on the
+#               first part of the data, the best 1/eta continue on a slice
+#               that is eta times longer, the last round is on all data
+#   tpe         sequential model based search (tree structured Parzen
+#               estimator, categorical): after a random start, combinations
+#               are drawn from the values of the best runs
+#
+# the candidates are the values of the grid (optimize section), random
+# choices use random.Random(seed) so a search can be repeated (and resumed)
+#
+# evaluate(todo, bars) runs combinations and returns their records, on the
+# first 'bars' bars or on all data if bars is None. The searches return the
+# records on all data
+#
+STRATEGIES = ['grid', 'random', 'halving', 'tpe']
+
+MIN_BARS = 750          # shortest data slice for successive halving
+
+TPE_GAMMA = 0.25        # fraction of the runs that are 'good'
+TPE_CANDIDATES = 24     # samples drawn from the good runs per choice
+
+Evaluate = typing.Callable[[list[dict], int], list[list]]
+
+
+#
+# the value to maximize, the sharpe ratio (None if there are no returns)
+#
+def score(record: list) -> float:
+    sharpe = record[optimizer.RESULT_COLUMNS.index('sharpe')]
+    return -math.inf if sharpe is None or math.isnan(sharpe) else sharpe
+
+
+
+#
+# the grid of the optimize section without expanding it, a combination is
+# identified by its index (mixed radix over the parameter values)
+#
+class SearchSpace:
+
+    def __init__(self, par: OptimizeParameters):
+        values = [par.tp_sl_ratio, par.sl_distance, par.backcandles, par.gap_window, par.zone_height, par.breakout_factor, par.bounces]
+        self.dims = list(zip(optimizer.PARAM_KEYS, values))
+        self.settings = optimizer.settings(par)
+        self.size = math.prod(len(v) for _, v in self.dims)
+
+
+    def __len__(self):
+        return self.size
+
+
+    # value index per parameter, the last parameter changes fastest (itertools.product)
+    def choice(self, idx: int) -> tuple:
+        choice = []
+        for _, values in reversed(self.dims):
+            idx, i = divmod(idx, len(values))
+            choice.append(i)
+        return tuple(reversed(choice))
+
+
+    def index(self, choice: tuple) -> int:
+        idx = 0
+        for (_, values), i in zip(self.dims, choice):
+            idx = idx * len(values) + i
+        return idx
+
+
+    def combination(self, idx: int) -> dict:
+        values = [v[i] for (_, v), i in zip(self.dims, self.choice(idx))]
+        return dict(zip(optimizer.PARAM_KEYS, values), **self.settings)
+
+
+
+def grid(space: SearchSpace, evaluate: Evaluate) -> list[list]:
+    return evaluate([space.combination(i) for i in range(len(space))], None)
+
+
+def random_search(space: SearchSpace, evaluate: Evaluate, budget: int, rng: random.Random) -> list[list]:
+    todo = rng.sample(range(len(space)), min(budget, len(space)))
+    return evaluate([space.combination(i) for i in todo], None)
+
+
+#
+# successive halving, 'budget' is the number of runs (on any slice)
+#
+# the number of rounds is limited by the shortest slice (MIN_BARS, the
+# sharpe ratio needs a few years of data), the best 1/eta of the last
+# slice continue on all data
+#
+def successive_halving(space: SearchSpace, evaluate: Evaluate, budget: int, rng: random.Random, eta: int, bars: int) -> list[list]:
+    rounds = 1
+    while bars // eta ** rounds >= MIN_BARS:
+        rounds = rounds + 1
+
+    # n + n/eta + n/eta^2 ... <= budget
+    n = int(budget / sum(eta ** -r for r in range(rounds)))
+    n = max(1, min(len(space), n))
+    rounds = min(rounds, 1 + int(math.log(n, eta))) if n > 1 else 1
+
+    todo = rng.sample(range(len(space)), n)
+    for r in range(rounds):
+        last = r == rounds - 1
+
+        # eta times more data per round, all data in the last round
+        slice_bars = None if last else bars // eta ** (rounds - 1 - r)
+
+        logger.info(f'search: halving round {r + 1}/{rounds}, {len(todo)} runs on {slice_bars or bars} bars\n')
+        records = evaluate([space.combination(i) for i in todo], slice_bars)
+        if last:
+            return records
+
+        ranked = sorted(zip(todo, records), key=lambda x: score(x[1]), reverse=True)
+        todo = [i for i, _ in ranked[:max(1, len(ranked) // eta)]]
+
+    return []
+
+
+
+#
+# categorical tree structured Parzen estimator
+#
+# the runs are split in good (best TPE_GAMMA) and bad ones; per parameter
+# l and g are the (smoothed) frequencies of its values in the good and bad
+# runs. Of TPE_CANDIDATES combinations drawn from l, the one with the
+# highest l/g that wasn't run yet is chosen. 'batch' combinations are chosen
+# per step (e.g. one per worker)
+#
+def tpe(space: SearchSpace, evaluate: Evaluate, budget: int, rng: random.Random, batch: int = 1) -> list[list]:
+    budget = min(budget, len(space))
+    startup = min(budget, max(10, budget // 4))
+
+    done = dict()   # index: record
+    todo = rng.sample(range(len(space)), startup)
+    for i, record in zip(todo, evaluate([space.combination(i) for i in todo], None)):
+        done[i] = record
+
+    def _frequencies(choices: list[tuple], dim: int, size: int) -> list[float]:
+        counts = [1.0] * size
+        for c in choices:
+            counts[c[dim]] += 1.0
+        total = sum(counts)
+        return [x / total for x in counts]
+
+    while len(done) < budget:
+        ranked = sorted(done, key=lambda i: score(done[i]), reverse=True)
+        ngood = max(1, math.ceil(TPE_GAMMA * len(ranked)))
+        good = [space.choice(i) for i in ranked[:ngood]]
+        bad  = [space.choice(i) for i in ranked[ngood:]]
+
+        sizes = [len(v) for _, v in space.dims]
+        l = [_frequencies(good, d, k) for d, k in enumerate(sizes)]
+        g = [_frequencies(bad, d, k) for d, k in enumerate(sizes)]
+
+        todo = []
+        for _ in range(min(batch, budget - len(done))):
+            best, best_ratio = None, -math.inf
+            for _ in range(TPE_CANDIDATES):
+                choice = tuple(rng.choices(range(k), weights=l[d])[0] for d, k in enumerate(sizes))
+                idx = space.index(choice)
+                if idx in done or idx in todo:
+                    continue
+
+                ratio = math.prod(l[d][c] / g[d][c] for d, c in enumerate(choice))
+                if ratio > best_ratio:
+                    best, best_ratio = idx, ratio
+
+            # all candidates were run already, take any other combination
+            while best is None:
+                idx = rng.randrange(len(space))
+                if not (idx in done or idx in todo):
+                    best = idx
+
+            todo.append(best)
+
+        logger.info(f'search: tpe, {len(done)} runs, best sharpe: {score(done[ranked[0]])}\n')
+        for i, record in zip(todo, evaluate([space.combination(i) for i in todo], None)):
+            done[i] = record
+
+    return list(done.values())
+
+
+
+#
+# runs the search strategy of the optimize parameters, returns the records
+# of the runs on all data
+#
+def search(par: OptimizeParameters, evaluate: Evaluate, bars: int, batch: int = 1) -> list[list]:
+    space = SearchSpace(par)
+    rng = random.Random(par.seed)
+
+    logger.info(f'search: {par.search}, {len(space)} combinations, budget: {par.budget}, seed: {par.seed}\n')
+
+    match par.search:
+        case 'grid':
+            return grid(space, evaluate)
+        case 'random':
+            return random_search(space, evaluate, par.budget, rng)
+        case 'halving':
+            return successive_halving(space, evaluate, par.budget, rng, par.eta, bars)
+        case 'tpe':
+            return tpe(space, evaluate, par.budget, rng, batch)
+        case _:
+            raise ValueError(f"optimize: unknown search '{par.search}', expected one of: {', '.join(STRATEGIES)}")
@@ -0,0 +1,156 @@
+import hashlib
+
+from pandas import DataFrame
+
+from algo import algo
+from pivot import PivotIndex
+from trading import Signal
+
+import logging
+logger = logging.getLogger()
+
+
+#
+# cache for the signal arrays of an optimization
+#
+# the signals only depend on the data and on backcandles, gap_window,
+# zone_height, breakout_f and bounces; tp_sl_ratio and sl_distance don't change
+# them. Every strategy instance created by cerebro.optstrategy gets the
+# same cache (through the signal_cache param) so each distinct signal
+# configuration is calculated only once
+#
+class SignalCache:
+
+    COLUMNS = ['Open', 'High', 'Low', 'Close', 'pivot']
+
+    def __init__(self, fingerprint: str):
+        self.fingerprint = fingerprint
+        self.signals = dict()
+        self.pivots = None      # PivotIndex of the data, built on the first calculation
+        self.hits = 0
+        self.misses = 0
+
+
+    #
+    # content hash of the price data and the pivots
+    #
+    @staticmethod
+    def data_fingerprint(data: DataFrame) -> str:
+        h = hashlib.sha1()
+        h.update(str(len(data)).encode())
+        for column in SignalCache.COLUMNS:
+            if column in data.columns:
+                h.update(column.encode())
+                h.update(data[column].to_numpy().tobytes())
+        return h.hexdigest()
+
+
+    @staticmethod
+    def from_data(data: DataFrame) -> 'SignalCache':
+        return SignalCache(SignalCache.data_fingerprint(data))
+
+
+    def key(self, backcandles: int, gap_window: int, zone_height: float, breakout_f: float, bounces: int = algo.BOUNCES) -> tuple:
+        return (self.fingerprint, backcandles, gap_window, zone_height, breakout_f, bounces)
+
+
+    def __len__(self):
+        return len(self.signals)
+
+
+    def __contains__(self, key):
+        return key in self.signals
+
+
+    def put(self, key: tuple, signals):
+        self.signals[key] = signals
+
+
+    #
+    # returns the signals for the given configuration, they are calculated
+    # on the first request (see algo.calc_signals); the pivots are indexed
+    # once for all configurations
+    #
+    def signals_for(self, high, low, close, pivots, backcandles: int, gap_window: int, zone_height: float, breakout_f: float, bounces: int = algo.BOUNCES):
+        key = self.key(backcandles, gap_window, zone_height, breakout_f, bounces)
+
+        signals = self.signals.get(key)
+        if signals is not None:
+            self.hits = self.hits + 1
+            return signals
+
+        self.misses = self.misses + 1
+        logger.debug(f'signal cache: calculating {key[1:]}')
+        if self.pivots is None:
+            self.pivots = PivotIndex.of(pivots, low, high)
+
+        signals = algo.calc_signals(
+                        high        = high,
+                        low         = low,
+                        close       = close,
+                        pivots      = self.pivots,
+                        backcandles = backcandles,
+                        gap_window  = gap_window,
+                        zone_height = zone_height,
+                        breakout_f  = breakout_f,
+                        bounces     = bounces
+                        )
+        self.signals[key] = signals
+        return signals
+
+
+    #
+    # same as signals_for, for a backtrader data feed
+    #
+    def get(self, data, backcandles: int, gap_window: int, pivots: list[int], zone_height: float, breakout_f: float, bounces: int = algo.BOUNCES):
+        return self.signals_for(data.high.array, data.low.array, data.close.array, pivots, backcandles, gap_window, zone_height, breakout_f, bounces)
+
+
+
+#
+# signals of the window [begin, end) of the data of a SignalCache
+#
+# the signals are calculated once on all data and then cut to the window, so
+# overlapping windows (e.g. walk forward folds) share the calculation. With
+# history False the candles a calculation on the window alone can't signal
+# (the first backcandles + gap_window and the last gap_window) are set to
+# Signal.NONE; with history True the bars before the window are used as a
+# live strategy would (the signal of a candle only uses earlier bars)
+#
+# same interface as SignalCache, the arrays passed to signals_for are ignored
+#
+class SignalWindow:
+
+    def __init__(self, cache: SignalCache, data: DataFrame, begin: int, end: int, history: bool = False):
+        self.cache = cache
+        self.columns = [data[c].to_numpy() for c in ['High', 'Low', 'Close', 'pivot']]
+        self.begin = begin
+        self.end = end
+        self.history = history
+
+
+    @property
+    def hits(self) -> int:
+        return self.cache.hits
+
+
+    @property
+    def misses(self) -> int:
+        return self.cache.misses
+
+
+    def signals_for(self, high, low, close, pivots, backcandles: int, gap_window: int, zone_height: float, breakout_f: float, bounces: int = algo.BOUNCES):
+        high, low, close, pivots = self.columns
+        signals = self.cache.signals_for(high, low, close, pivots, backcandles, gap_window, zone_height, breakout_f, bounces)[self.begin:self.end]
+
+        if self.history:
+            return signals
+
+        signals = signals.copy()
+        signals[:backcandles + gap_window] = Signal.NONE
+        signals[max(0, len(signals) - gap_window):] = Signal.NONE
+        return signals
+
+
+    def get(self, data, backcandles: int, gap_window: int, pivots: list[int], zone_height: float, breakout_f: float, bounces: int = algo.BOUNCES):
+        return self.signals_for(None, None, None, None, backcandles, gap_window, zone_height, breakout_f, bounces)
@@ -0,0 +1,240 @@
+from collections import deque
+
+from trading import Signal, Trend
+from pivot import Pivot
+from algo import algo
+
+
+#
+# rolling min (or max) of the last 'width' values (monotonic deque)
+#
+# the deque holds (index, value) with increasing (decreasing) values,
+# the front is the min (max) of the window; every value is pushed and
+# popped once so append is O(1) amortized
+#
+class _RollingExtreme:
+
+    def __init__(self, width: int, is_min: bool):
+        self.width = width
+        self.is_min = is_min
+        self.items = deque()
+
+
+    def append(self, idx: int, value: float):
+        items = self.items
+        if self.is_min:
+            while items and items[-1][1] >= value:
+                items.pop()
+        else:
+            while items and items[-1][1] <= value:
+                items.pop()
+
+        items.append((idx, value))
+        while items[0][0] <= idx - self.width:
+            items.popleft()
+
+
+    def value(self) -> float:
+        return self.items[0][1]
+
+
+
+#
+# the last _N pivots (lows or highs) before the end of the window
+#
+# confirmed pivots are pending until the window end passes them, then they
+# enter the last _N; the zone mean is only recalculated when a pivot enters.
+# The mean is the sum of the last _N (left to right) divided by _N and the
+# deviation is taken from their min and max, as in PivotIndex.zones (same
+# values as the vectorized calculation), O(_N) per pivot
+#
+class _PivotZone:
+
+    def __init__(self, bounces: int, zone_height: float):
+        self.bounces = bounces
+        self.zone_height = zone_height
+        self.pending = deque()
+        self.last = deque(maxlen=bounces)
+        self.mean = None        # zone mean of last, None if no zone
+
+
+    def add(self, idx: int, value: float):
+        self.pending.append((idx, value))
+
+
+    #
+    # moves the pivots before 'end' into the window and returns the zone mean
+    # of the last _N pivots if the first one is >= begin, else None
+    #
+    def update(self, begin: int, end: int) -> float:
+        changed = False
+        while self.pending and self.pending[0][0] < end:
+            self.last.append(self.pending.popleft())
+            changed = True
+
+        if changed and len(self.last) == self.bounces:
+            values = [v for _, v in self.last]
+            total = values[0]
+            for value in values[1:]:
+                total += value
+            mean = total / self.bounces
+            deviation = max(max(values) - mean, mean - min(values))
+            self.mean = None if deviation > self.zone_height * mean else mean
+
+        if len(self.last) < self.bounces or self.last[0][0] < begin:
+            return None
+        return self.mean
+
+
+
+#
+# trend of the last candle (see algo.calc_trend_filter), one bar at a time
+#
+# the ema is updated as pandas ewm(adjust=False) does, the window test
+# only needs the last candle above (below) the ema
+#
+class _TrendFilter:
+
+    def __init__(self, ema_period: int, backcandles: int):
+        self.ema_period = ema_period
+        self.backcandles = backcandles
+        self.alpha = 2.0 / (ema_period + 1.0)
+        self.ema = None
+        self.last_above = -1
+        self.last_below = -1
+
+
+    def append(self, idx: int, open: float, close: float) -> int:
+        if self.ema is None:
+            self.ema = close
+        else:
+            old = 1.0 - self.alpha
+            self.ema = (old * self.ema + self.alpha * close) / (old + self.alpha)
+
+        if idx < self.ema_period - 1:
+            return Trend.NONE
+
+        # max(open, close), min(open, close)
+        if (close if close > open else open) > self.ema:
+            self.last_above = idx
+        if (close if close < open else open) < self.ema:
+            self.last_below = idx
+
+        if idx < self.ema_period - 1 + self.backcandles:
+            return Trend.NONE
+
+        first = idx - self.backcandles
+        return (Trend.UP if self.last_below < first else Trend.NONE) | (Trend.DOWN if self.last_above < first else Trend.NONE)
+
+
+
+#
+# incremental signal calculation, one bar at a time
+#
+# append() takes the next bar and returns its signal. A pivot (see
+# pivot.pivot_candle) can only be confirmed pivot_window bars later, the
+# signal of candle i uses the confirmed pivots in [i-backcandles-gap_window,
+# i-gap_window) (see algo.calc_signal). The state is bounded by the window
+# sizes, so the time per bar doesn't depend on the length of the history
+#
+# with gap_window >= pivot_window the signals are the same as the ones of
+# algo.calc_signals, except for the last gap_window candles (calc_signals
+# doesn't calculate these, it needs the complete buffer)
+#
+# with trend_filter set, only signals in the direction of the trend are
+# emitted (see algo.filter_trend)
+#
+class SignalEngine:
+
+    def __init__(self, pivot_window: int, backcandles: int, gap_window: int, zone_height: float, breakout_f: float, bounces: int = algo.BOUNCES,
+                 trend_filter: bool = False, ema_period: int = 50, trend_backcandles: int = 10):
+        self.pivot_window = pivot_window
+        self.backcandles = backcandles
+        self.gap_window = gap_window
+        self.zone_height = zone_height
+        self.breakout_f = breakout_f
+
+        if bounces < 1:
+            raise ValueError(f'bounces must be >= 1, got: {bounces}')
+
+        width = 2 * pivot_window + 1
+        self.bars = deque(maxlen=width)     # (low, high) of the pivot window
+        self.lows = _RollingExtreme(width, is_min=True)
+        self.highs = _RollingExtreme(width, is_min=False)
+
+        self.zone_low = _PivotZone(bounces, zone_height)
+        self.zone_high = _PivotZone(bounces, zone_height)
+
+        self.trend = _TrendFilter(ema_period, trend_backcandles) if trend_filter else None
+
+        self.size = 0           # number of bars appended
+        self.last_pivot = None  # (index, Pivot code) of the last confirmed candle
+
+
+    #
+    # pivot code of the candle in the middle of the window (NaN never
+    # compares as lower/higher, as in pivot.pivots)
+    #
+    def _confirm_pivot(self, idx: int) -> int:
+        low, high = self.bars[self.pivot_window]
+
+        code = Pivot.NONE
+        if not self.lows.value() < low:
+            code |= Pivot.LOW
+        if not self.highs.value() > high:
+            code |= Pivot.HIGH
+
+        # as in pivot.PivotIndex, a candle that is both is neither a low nor a high pivot
+        if code == Pivot.LOW:
+            self.zone_low.add(idx, low)
+        elif code == Pivot.HIGH:
+            self.zone_high.add(idx, high)
+
+        return code
+
+
+    #
+    # adds the next bar, returns the signal for it
+    #
+    def append(self, open: float, high: float, low: float, close: float) -> int:
+        idx = self.size
+        self.size = self.size + 1
+
+        signal = self._signal(idx, high, low, close)
+        if self.trend is None:
+            return signal
+
+        trend = self.trend.append(idx, open, close)
+        if signal == Signal.SELL and trend & Trend.DOWN:
+            return signal
+        if signal == Signal.BUY and trend & Trend.UP:
+            return signal
+        return Signal.NONE
+
+
+    def _signal(self, idx: int, high: float, low: float, close: float) -> int:
+        self.bars.append((low, high))
+        self.lows.append(idx, float('inf') if low != low else low)
+        self.highs.append(idx, float('-inf') if high != high else high)
+
+        center = idx - self.pivot_window
+        if center >= self.pivot_window:
+            self.last_pivot = (center, self._confirm_pivot(center))
+
+        begin = idx - self.backcandles - self.gap_window
+        end   = idx - self.gap_window
+        if begin < 0:
+            return Signal.NONE
+
+        _F = self.breakout_f
+        zheight = self.zone_height
+
+        mean = self.zone_low.update(begin, end)
+        if mean is not None and (mean - close) > zheight * mean * _F:
+            return Signal.SELL
+
+        mean = self.zone_high.update(begin, end)
+        if mean is not None and (close - mean) > zheight * mean * _F:
+            return Signal.BUY
+
+        return Signal.NONE
@@ -0,0 +1,86 @@
+import importlib.util
+import subprocess
+import sys
+
+
+#
+# import cost of the modules of a code path
+#
+# the modules are imported in a fresh interpreter with -X importtime, the
+# report lists per stage (a module of the code path) the modules it pulled
+# in, grouped by top level package, with the self time (the import of the
+# package itself) and the total of the stage:
+#
+#   stage          package            self [ms]
+#   breakout       pandas                 180.2
+#   ...
+#
+# the stages are imported in the given order, a package is charged to the
+# first stage that imports it, stages that are not installed are skipped
+#
+
+
+#
+# runs the imports, returns the -X importtime lines as (self us, cumulative us, depth, module)
+#
+def import_times(modules: list[str]) -> list[tuple[int, int, int, str]]:
+    code = '; '.join(f'import {x}' for x in modules)
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f'profile startup: {code} failed\n{proc.stderr.strip().splitlines()[-1]}')
+
+    result = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        result.append((int(self_us), int(cumulative), depth, name.strip()))
+    return result
+
+
+#
+# self time per top level package of every stage, returns [(stage, package, self us)]
+#
+def profile(stages: list[str]) -> list[tuple[str, str, int]]:
+    times = import_times(stages)
+
+    # the lines of a stage end with its own top level line (depth 0),
+    # importtime prints a module after the modules it imported. Other top
+    # level lines are the interpreter startup (site, encodings)
+    result = []
+    per_package = dict()
+    for self_us, _, depth, name in times:
+        package = name.split('.')[0]
+        per_package[package] = per_package.get(package, 0) + self_us
+
+        if depth == 0:
+            if name in stages:
+                result.extend((name, k, v) for k, v in sorted(per_package.items(), key=lambda x: -x[1]))
+            per_package = dict()
+
+    return result
+
+
+def report(stages: list[str], limit: int = 10) -> None:
+    missing = [x for x in stages if importlib.util.find_spec(x) is None]
+    stages = [x for x in stages if x not in missing]
+    rows = profile(stages)
+
+    print(f"{'stage':<20} {'package':<24} {'self [ms]':>10}")
+    total = 0
+    for stage in stages:
+        selected = [x for x in rows if x[0] == stage]
+        stage_us = sum(x[2] for x in selected)
+        total += stage_us
+
+        for _, package, self_us in selected[:limit]:
+            print(f"{stage:<20} {package:<24} {self_us / 1000.0:>10.1f}")
+        if len(selected) > limit:
+            rest = sum(x[2] for x in selected[limit:])
+            print(f"{stage:<20} {f'({len(selected) - limit} more)':<24} {rest / 1000.0:>10.1f}")
+        print(f"{stage:<20} {'total':<24} {stage_us / 1000.0:>10.1f}\n")
+
+    print(f"{'all stages':<45} {total / 1000.0:>10.1f}")
+    if missing:
+        print(f"not installed: {', '.join(missing)}")
@@ -0,0 +1,64 @@
+import itertools
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from algo import algo
+from pivot import PivotIndex, pivots
+
+
+PIVOT_WINDOW = 6
+
+GRID = dict(
+    backcandles = [20, 40],
+    gap_window  = [6, 10],
+    zone_height = [0.001, 0.005, 0.01],
+    breakout_f  = [1.0, 2.0],
+    bounces     = [2, 3, 4]
+)
+
+
+# the parts of a backtrader data feed calc_signal reads
+class Feed:
+
+    def __init__(self, close: np.ndarray):
+        self.close = SimpleNamespace(array=close)
+
+    def buflen(self) -> int:
+        return len(self.close.array)
+
+
+@pytest.fixture(scope='module')
+def eurusd():
+    data = pd.read_csv('data/eurusd_d.csv')
+    high, low, close = (data[c].to_numpy() for c in ['High', 'Low', 'Close'])
+    return high, low, close, pivots(low, high, PIVOT_WINDOW)
+
+
+#
+# calc_signals (vectorized, PivotIndex.zones) must give the same signals as
+# calc_signal (per candle, statistics.mean) for every candle
+#
+def test_calc_signals(eurusd):
+    high, low, close, pvts = eurusd
+    index = PivotIndex(pvts, low, high)
+    feed = Feed(close.tolist())
+
+    total = 0
+    for values in itertools.product(*GRID.values()):
+        par = dict(zip(GRID, values))
+        result = algo.calc_signals(high, low, close, pvts, **par)
+        expected = [algo.calc_signal(feed, i, pivots=index, **par) for i in range(len(close))]
+
+        assert np.array_equal(result, expected), par
+        total = total + np.count_nonzero(result)
+
+    assert total > 0
+
+
+def test_bounces():
+    high, low, close = np.ones(50), np.ones(50), np.ones(50)
+    with pytest.raises(ValueError):
+        algo.calc_signals(high, low, close, np.zeros(50), 10, 6, 0.001, 2.0, bounces=0)
@@ -0,0 +1,67 @@
+import math
+
+import backtrader as bt
+import numpy as np
+import pandas as pd
+import pytest
+
+from feeds import date_numbers
+from parameters import OptimizeParameters, TradingParameters
+from pivot import pivot
+from signalcache import SignalCache
+import optimizer
+
+
+PIVOT_WINDOW = 6
+
+
+@pytest.fixture(scope='module')
+def eurusd():
+    data = pd.read_csv('data/eurusd_d.csv')
+    data = data.rename({"Gmt time": "Date"}, axis = 1)
+    data['Date'] = pd.to_datetime(data['Date'], format="%d.%m.%Y %H:%M:%S.%f")
+    data = data.set_index('Date')
+    data['pivot'] = pivot(data=data, pivot_window=PIVOT_WINDOW)
+    return data
+
+
+@pytest.mark.parametrize('unit', ['us', 'ns'])
+def test_date_numbers(unit):
+    index = pd.DatetimeIndex(['2003-05-04 00:00:00', '2017-01-01 13:30:15', '2024-02-29 23:59:59.5']).as_unit(unit)
+    expected = [bt.date2num(x.to_pydatetime()) for x in index]
+    assert np.allclose(date_numbers(index), expected, rtol=0.0, atol=1e-9)
+
+
+def test_date_numbers_tz():
+    index = pd.DatetimeIndex(['2017-01-01 13:30:00'], tz='Europe/Zurich')
+    assert date_numbers(index)[0] == pytest.approx(bt.date2num(pd.Timestamp('2017-01-01 12:30:00').to_pydatetime()), abs=1e-9)
+
+
+#
+# backtrader (with the ArrayData feed) and the kernel give the same metrics
+#
+def test_run_combination_matches_kernel(eurusd):
+    def _same(x, y):
+        if x is None or y is None:
+            return x is None and y is None
+        return math.isclose(x, y, rel_tol=1e-9, abs_tol=1e-12)
+
+    trading_par = TradingParameters(None)
+    signal_cache = SignalCache.from_data(eurusd)
+    n = len(optimizer.PARAM_KEYS)
+
+    # close to the run section of conf/dr.json, all of them trade on the daily data
+    par = OptimizeParameters(None)
+    par.gap_window = [7]
+    par.backcandles = [39]
+    par.sl_distance = [0.033]
+    par.tp_sl_ratio = [2.0]
+    par.zone_height = [0.005, 0.0105]
+    par.breakout_factor = [1.0, 2.0]
+
+    for combination in optimizer.combinations(par):
+        record = optimizer.run_combination(eurusd, trading_par, 'EURUSD', signal_cache, combination)
+        result = optimizer.kernel_backtest(eurusd, trading_par, signal_cache, combination)
+
+        assert record[n + 3] is not None
+        assert all(_same(x, y) for x, y in zip(record[n:], [result.rtot, result.rnorm100, result.maxdd, result.sharpe]))
@@ -0,0 +1,82 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from algo import algo
+from mtf import MultiTimeframe
+from pivot import Pivot
+from trading import Signal
+
+
+GRID = dict(
+    backcandles = [10, 20],
+    gap_window  = [6, 8],
+    zone_height = [0.01, 0.02],
+    breakout_f  = [1.0, 2.0],
+    bounces     = [2, 3]
+)
+
+
+@pytest.fixture(scope='module')
+def eurusd():
+    data = pd.read_csv('data/eurusd_d.csv')
+    data = data.rename({"Gmt time": "Date"}, axis = 1)
+    data['Date'] = pd.to_datetime(data['Date'], format="%d.%m.%Y %H:%M:%S.%f")
+    return data.set_index('Date')
+
+
+#
+# daily bars, weekly zones: a week is closed for a day if the day is the
+# last one of the week (weeks start on monday), the empty days don't count
+#
+def test_closed(eurusd):
+    zones = MultiTimeframe(eurusd, 'w')
+
+    dates = pd.DatetimeIndex(eurusd.index)
+    weeks = dates.to_period('W-SUN').start_time
+    nonempty = np.unique(weeks[eurusd['Volume'].to_numpy() != 0])
+    ends = nonempty + pd.Timedelta(days=7)
+
+    expected = [np.count_nonzero(ends <= x + pd.Timedelta(days=1)) for x in dates]
+    assert np.array_equal(zones.closed, expected)
+    assert zones.closed.max() > 0
+
+
+#
+# the signal of a day, the zones of the weekly pivots of its window (see
+# algo.calc_signal)
+#
+def _signal(zones: MultiTimeframe, i: int, backcandles: int, gap_window: int, zone_height: float, breakout_f: float, bounces: int) -> int:
+    begin = zones.closed[i] - backcandles - gap_window
+    end = zones.closed[i] - gap_window
+    if begin < 0:
+        return Signal.NONE
+
+    cclose = zones.close[i]
+    pvts = zones.pivots.last(Pivot.LOW, begin, end, bounces).tolist()
+    if len(pvts) == bounces:
+        sig = algo._check_breakout(lambda mean, cclose, zheight: (Signal.SELL if (mean - cclose) > zheight * mean * breakout_f else 0), pvts, zone_height, cclose)
+        if sig != Signal.NONE:
+            return sig
+
+    pvts = zones.pivots.last(Pivot.HIGH, begin, end, bounces).tolist()
+    if len(pvts) == bounces:
+        return algo._check_breakout(lambda mean, cclose, zheight: (Signal.BUY if (cclose - mean) > zheight * mean * breakout_f else 0), pvts, zone_height, cclose)
+    return Signal.NONE
+
+
+def test_signals(eurusd):
+    zones = MultiTimeframe(eurusd, 'w')
+
+    total = 0
+    for values in itertools.product(*GRID.values()):
+        par = dict(zip(GRID, values))
+        result = zones.calc_signals(**par)
+        expected = [_signal(zones, i, **par) for i in range(len(eurusd))]
+
+        assert np.array_equal(result, expected), par
+        total = total + np.count_nonzero(result)
+
+    assert total > 0
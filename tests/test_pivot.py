@@ -0,0 +1,65 @@
+import numpy as np
+import pandas as pd
+import pytest
+from pandas import DataFrame
+
+from pivot import Pivot, pivot, pivot_candle, pivots
+
+
+#
+# pivots (vectorized) must give the same codes as pivot_candle (reference)
+#
+def reference(data: DataFrame, pivot_window: int) -> np.ndarray:
+    return np.array([pivot_candle(data, i, pivot_window) for i in range(len(data))], dtype=np.int8)
+
+
+def frame(low, high) -> DataFrame:
+    return DataFrame(dict(Low=np.asarray(low, dtype=np.float64), High=np.asarray(high, dtype=np.float64)))
+
+
+@pytest.fixture(scope='module')
+def eurusd() -> DataFrame:
+    return pd.read_csv('data/eurusd_d.csv')
+
+
+@pytest.mark.parametrize('pivot_window', [1, 3, 6])
+def test_eurusd(eurusd, pivot_window):
+    expected = reference(eurusd, pivot_window)
+    result = pivot(data=eurusd, pivot_window=pivot_window).to_numpy()
+
+    assert result.dtype == np.int8
+    assert np.array_equal(result, expected)
+    assert np.count_nonzero(expected) > 0
+
+
+# equal lows (highs) in the window don't rule out a pivot, a candle can be both
+def test_ties():
+    data = frame(low=[2, 1, 1, 1, 2, 3, 3, 3, 2], high=[3, 4, 4, 4, 3, 5, 5, 5, 4])
+    for pivot_window in [1, 2]:
+        result = pivots(data['Low'], data['High'], pivot_window)
+        assert np.array_equal(result, reference(data, pivot_window))
+
+    assert (pivots(data['Low'], data['High'], 1) == Pivot.LOW | Pivot.HIGH).any()
+
+
+# NaN never compares as lower/higher
+def test_nan():
+    low = [1.0, 0.5, np.nan, 0.7, 1.2, 0.9, np.nan, np.nan, 0.4, 1.0, 1.1]
+    high = [2.0, np.nan, 1.5, 1.8, 2.2, np.nan, 1.9, 2.5, 1.0, 1.3, np.nan]
+    data = frame(low, high)
+    for pivot_window in [1, 2, 3]:
+        assert np.array_equal(pivots(low, high, pivot_window), reference(data, pivot_window))
+
+
+# the first and last pivot_window candles and series shorter than the window
+@pytest.mark.parametrize('size', [0, 1, 4, 5, 6, 7])
+def test_edges(size):
+    rng = np.random.default_rng(size)
+    low = rng.random(size)
+    high = low + rng.random(size)
+    data = frame(low, high)
+
+    result = pivots(low, high, 2)
+    assert len(result) == size
+    assert np.array_equal(result, reference(data, 2))
+    assert not result[:2].any() and not result[max(0, size-2):].any()
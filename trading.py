@@ -5,3 +5,8 @@ class Signal:
     EITHER = BUY | SELL
     NONE   = 0
 
+
+class Trend:
+    UP     = 2
+    DOWN   = 1
+    NONE   = 0
@@ -0,0 +1,181 @@
+import multiprocessing
+
+import numpy as np
+from pandas import DataFrame
+
+from BreakoutStrategy import BreakoutStrategy
+from signalcache import SignalCache, SignalWindow
+from parameters import OptimizeParameters, TradingParameters, WalkForwardParameters
+from optimizer import SharedFrame
+from feeds import feed_frame
+import optimizer
+import search
+import kernel
+
+import logging
+logger = logging.getLogger()
+
+
+#
+# walk forward optimization
+#
+# the data is split in folds of a train window followed by a test window:
+#
+#   rolling     train [e-train, e), test [e, e+test)
+#   anchored    train [0, e), test [e, e+test)
+#
+# with e = train, train+test, train+2*test, ... The search of the optimize
+# section runs on every train window, the best combination (sharpe) is then
+# run on the test window. The out of sample equity curves of the test
+# windows are chained into one curve.
+#
+# the pivots and the feed columns (feeds.py) are calculated once on all data
+# and the signals of a signal configuration once per process (SignalWindow),
+# the folds only cut them
+#
+FOLD_COLUMNS = ['fold', 'train-begin', 'train-end', 'test-begin', 'test-end'] + optimizer.RESULT_COLUMNS[:len(optimizer.PARAM_KEYS)] + \
+               ['is-sharpe', 'total', 'yearly', 'max-dd', 'sharpe']
+
+
+class Fold:
+
+    def __init__(self, nr: int, train: tuple[int, int], test: tuple[int, int]):
+        self.nr = nr
+        self.train = train      # [begin, end) bars
+        self.test = test
+
+        self.insample = None    # record of the best combination on the train window
+        self.outsample = None   # record of the best combination on the test window
+        self.values = None      # portfolio value per bar of the test window
+
+
+
+def folds(size: int, train: int, test: int, anchored: bool) -> list[Fold]:
+    if train <= 0 or test <= 0:
+        raise ValueError(f'walkforward: train ({train}) and test ({test}) must be > 0')
+
+    result = []
+    end = train
+    while end < size:
+        begin = 0 if anchored else end - train
+        result.append(Fold(len(result), (begin, end), (end, min(size, end + test))))
+        end = end + test
+    return result
+
+
+
+#
+# optimizes on the train window and runs the best combination on the test window
+#
+def run_fold(data: DataFrame, signal_cache: SignalCache, fold: Fold, par: OptimizeParameters, trading_par: TradingParameters, ticker: str) -> Fold:
+    train_begin, train_end = fold.train
+
+    # runs on the first 'bars' bars of the train window
+    def _evaluate(todo: list[dict], bars: int) -> list[list]:
+        end = train_end if bars is None else train_begin + bars
+        window = data.iloc[train_begin:end]
+        signals = SignalWindow(signal_cache, data, train_begin, end)
+        return [optimizer.backtest(par.engine, window, trading_par, ticker, signals, x)[0] for x in todo]
+
+    records = search.search(par, _evaluate, bars=train_end - train_begin)
+    fold.insample = max(records, key=search.score)
+
+    n = len(optimizer.PARAM_KEYS)
+    combination = dict(zip(optimizer.PARAM_KEYS, fold.insample[:n]), **optimizer.settings(par))
+
+    # the test window starts trading at once, its signals use the bars before it
+    test_begin, test_end = fold.test
+    signals = SignalWindow(signal_cache, data, test_begin, test_end, history=True)
+    fold.outsample, fold.values = optimizer.backtest(par.engine, data.iloc[test_begin:test_end], trading_par, ticker, signals, combination)
+
+    logger.info(f'walkforward: fold {fold.nr}, train {fold.train}, test {fold.test}, in sample sharpe: {fold.insample[-1]}, out of sample sharpe: {fold.outsample[-1]}\n')
+    return fold
+
+
+
+#
+# worker process state, set by _init_worker
+#
+_worker = dict()
+
+def _init_worker(desc: dict, par: OptimizeParameters, trading_par: TradingParameters, ticker: str, long: bool, short: bool, verbose: bool):
+    shm, data = SharedFrame.attach(desc)
+
+    BreakoutStrategy.LONG = long
+    BreakoutStrategy.SHORT = short
+    BreakoutStrategy.VERBOSE = verbose
+
+    _worker['shm'] = shm
+    _worker['data'] = data
+    _worker['par'] = par
+    _worker['trading'] = trading_par
+    _worker['ticker'] = ticker
+    _worker['signal_cache'] = SignalCache.from_data(data)
+
+
+def _run_worker(fold: Fold) -> Fold:
+    return run_fold(_worker['data'], _worker['signal_cache'], fold, _worker['par'], _worker['trading'], _worker['ticker'])
+
+
+
+#
+# runs the folds, concurrently if wf_par.workers > 1
+#
+def walk_forward(data: DataFrame, par: OptimizeParameters, wf_par: WalkForwardParameters, trading_par: TradingParameters, ticker: str) -> list[Fold]:
+    todo = folds(len(data), wf_par.train, wf_par.test, wf_par.anchored)
+    if not todo:
+        raise ValueError(f'walkforward: no folds, {len(data)} bars with train: {wf_par.train}')
+
+    workers = min(optimizer.cpu_count(wf_par.workers), len(todo))
+    logger.info(f'walkforward: {len(todo)} folds on {workers} workers\n')
+
+    # the feed columns are shared by the folds (and the workers)
+    data = feed_frame(data)
+
+    if workers == 1:
+        signal_cache = SignalCache.from_data(data)
+        return [run_fold(data, signal_cache, x, par, trading_par, ticker) for x in todo]
+
+    shared = SharedFrame(data)
+    try:
+        initargs = (shared.describe(), par, trading_par, ticker, BreakoutStrategy.LONG, BreakoutStrategy.SHORT, BreakoutStrategy.VERBOSE)
+        with multiprocessing.Pool(processes=workers, initializer=_init_worker, initargs=initargs) as pool:
+            return pool.map(_run_worker, todo, chunksize=1)
+    finally:
+        shared.close()
+
+
+
+#
+# the out of sample equity curve, every test window continues with the end
+# value of the previous one
+#
+def equity(data: DataFrame, done: list[Fold], start_value: float) -> DataFrame:
+    values = []
+    value = start_value
+    for fold in done:
+        curve = fold.values * (value / start_value)
+        values.append(curve)
+        value = curve[-1]
+
+    begin, end = done[0].test[0], done[-1].test[1]
+    return DataFrame(dict(
+                value = np.concatenate(values),
+                fold  = np.concatenate([np.full(len(x.values), x.nr) for x in done])
+                ), index=data.index[begin:end])
+
+
+def fold_records(data: DataFrame, done: list[Fold]) -> list[list]:
+    n = len(optimizer.PARAM_KEYS)
+    dates = data.index
+    return [
+        [x.nr, dates[x.train[0]], dates[x.train[1] - 1], dates[x.test[0]], dates[x.test[1] - 1]] +
+        x.insample[:n] + [x.insample[-1]] + x.outsample[n:] for x in done
+    ]
+
+
+#
+# metrics of the out of sample equity curve (Returns, DrawDown, SharpeRatio)
+#
+def summary(curve: DataFrame, start_value: float) -> tuple[float, float, float, float]:
+    return kernel.metrics(curve['value'].to_numpy(), curve.index.to_numpy(), start_value)